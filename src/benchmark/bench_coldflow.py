@@ -0,0 +1,233 @@
+"""
+End-to-end ColdFlow benchmark that needs no Gmail or Groq account: synthetic lead sheets go
+through the real read -> generate -> send -> write pipeline, with FakeGroqClient answering
+prompts and an SMTPSink on localhost accepting the mail.
+
+    python src/benchmark/bench_coldflow.py --rows 100 1000 10000 --llm-latency 0.05 --smtp-latency 0.01
+
+Every run prints rows/s, sends/s, peak RSS and per-stage time, and is appended to
+benchmarks/results.jsonl. A run is flagged as a regression when its rows/s is more than
+--tolerance below the previous run with the same configuration; --fail-on-regression turns
+that into a non-zero exit status.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+from smtp_sink import SMTPSink
+from synthetic import make_lead_workbook
+
+DEFAULT_RESULTS = os.path.join('benchmarks', 'results.jsonl')
+CONFIG_KEYS = ("rows", "workers", "streaming", "llm_latency", "llm_words", "smtp_latency",
+               "smtp_failure_rate", "smtp_disconnect_rate", "attachment_kb")
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_once(config, smtp_port, results):
+    """Child process body: build the workbook, run ColdFlow end to end and report back."""
+    sys.path.insert(0, os.path.abspath(os.path.join(BENCH_DIR, '../excel')))
+    sys.path.insert(0, os.path.abspath(os.path.join(BENCH_DIR, '../llm')))
+    sys.path.insert(0, os.path.abspath(os.path.join(BENCH_DIR, '../email')))
+    os.environ.setdefault('COLDFLOW_GROQ_API_KEY', 'benchmark')
+    import write_excel  # type: ignore
+    from generate_content import CoverLetterGenerator  # type: ignore
+    from rate_limiter import RateLimiter  # type: ignore
+    from send_email import EmailSender  # type: ignore
+    from journal import SendJournal  # type: ignore
+    from retry_queue import RetryQueue  # type: ignore
+    from body_store import BodyStore  # type: ignore
+    from metrics import metrics  # type: ignore
+    from fake_llm import FakeGroqClient
+
+    logging.getLogger('coldflow_logger').disabled = not config["with_logging"]
+    with tempfile.TemporaryDirectory() as directory:
+        path = make_lead_workbook(os.path.join(directory, 'leads.xlsx'), config["rows"], seed=config["rows"])
+        attachment = os.path.join(directory, 'resume.pdf')
+        with open(attachment, 'wb') as attachment_file:
+            attachment_file.write(os.urandom(config["attachment_kb"] * 1024))
+        write_excel.attachment_path = attachment
+
+        generator = CoverLetterGenerator(rate_limiter=RateLimiter(None, None))
+        generator.client = FakeGroqClient(latency=config["llm_latency"], words=config["llm_words"], seed=0)
+        sender = EmailSender('bench@example.com', 'benchmark', '127.0.0.1', smtp_port, starttls=False)
+        journal = SendJournal(os.path.join(directory, 'journal.sqlite3'))
+        retry_queue = RetryQueue(os.path.join(directory, 'retry.sqlite3'))
+        body_store = BodyStore(os.path.join(directory, 'bodies.sqlite3'))
+
+        started = time.perf_counter()
+        coldflow = write_excel.ColdFlow(path, streaming=config["streaming"], journal=journal,
+                                        generator=generator, sender=sender, retry_queue=retry_queue,
+                                        body_store=body_store)
+        coldflow.process_excel_sheet(workers=config["workers"])
+        coldflow.save_workbook()
+        wall = time.perf_counter() - started
+        journal.close()
+        retry_queue.close()
+        body_store.close()
+
+    summary = metrics.summary()
+    results.put({
+        "wall_seconds": round(wall, 3),
+        "rows_sent": len(coldflow.sent_rows),
+        "rows_deferred": len(coldflow.deferred_rows),
+        "rows_per_second": round(config["rows"] / wall, 1),
+        "sends_per_second": round(len(coldflow.sent_rows) / wall, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": {stage: {"count": stats["count"], "errors": stats["errors"],
+                           "total_seconds": stats["total_seconds"], "p95_seconds": stats["p95_seconds"]}
+                   for stage, stats in summary["stages"].items()},
+        "pipeline": coldflow.pipeline_report,
+        "counters": summary["counters"],
+    })
+
+
+def run(config):
+    """Run one configuration in a fresh process (so peak RSS is its own) against a local SMTP sink."""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    with SMTPSink(latency=config["smtp_latency"], failure_rate=config["smtp_failure_rate"],
+                  disconnect_rate=config["smtp_disconnect_rate"], seed=0) as sink:
+        child = context.Process(target=run_once, args=(config, sink.port, results))
+        child.start()
+        result = None
+        while result is None:
+            try:
+                result = results.get(timeout=1.0)
+            except queue.Empty:
+                if not child.is_alive():
+                    try:  # It may have put its result just before exiting
+                        result = results.get(timeout=1.0)
+                    except queue.Empty:
+                        raise RuntimeError(f"Benchmark run for {config['rows']} rows died "
+                                           f"(exit code {child.exitcode}) without reporting a result.")
+        child.join()
+        result["smtp_sink"] = sink.stats()
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=BENCH_DIR, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def previous_result(results_path, config):
+    """The most recent stored run with the same configuration, if any."""
+    if not os.path.exists(results_path):
+        return None
+    previous = None
+    with open(results_path, encoding='utf-8') as results_file:
+        for line in results_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if all(entry.get("config", {}).get(key) == config[key] for key in CONFIG_KEYS):
+                previous = entry
+    return previous
+
+
+def store_result(results_path, entry):
+    directory = os.path.dirname(results_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(results_path, 'a', encoding='utf-8') as results_file:
+        results_file.write(json.dumps(entry, default=str) + "\n")
+
+
+def print_result(config, result, baseline, regressed):
+    stages = result["stages"]
+    def total(stage):
+        return stages.get(stage, {}).get("total_seconds", 0.0)
+    print(f"{config['rows']:>8} rows  sent={result['rows_sent']:>7}  wall={result['wall_seconds']:8.2f}s  "
+          f"{result['rows_per_second']:>9.1f} rows/s  {result['sends_per_second']:>7.2f} sends/s  "
+          f"peak RSS={result['peak_rss_mb']} MB")
+    print(f"{'':>8}       load={total('excel.load'):.2f}s plan={total('excel.plan'):.2f}s "
+          f"llm={total('llm.generate'):.2f}s smtp={total('smtp.send'):.2f}s "
+          f"(handshake {total('smtp.handshake'):.2f}s) save={total('excel.save'):.2f}s  "
+          f"sink={result['smtp_sink']}")
+    if baseline is not None:
+        change = result["rows_per_second"] / baseline["result"]["rows_per_second"] - 1
+        marker = "  REGRESSION" if regressed else ""
+        print(f"{'':>8}       vs {baseline.get('revision') or 'previous'} ({baseline['timestamp']}): "
+              f"{change:+.1%} rows/s{marker}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end ColdFlow benchmark.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--streaming', action='store_true', help="open the workbook read-only (streaming mode)")
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="seconds per fake completion")
+    parser.add_argument('--llm-words', type=int, default=180, help="words per fake completion")
+    parser.add_argument('--smtp-latency', type=float, default=0.01, help="seconds the sink takes per message")
+    parser.add_argument('--smtp-failure-rate', type=float, default=0.0, help="share of messages answered with 451")
+    parser.add_argument('--smtp-disconnect-rate', type=float, default=0.0, help="share of messages that drop the connection")
+    parser.add_argument('--attachment-kb', type=int, default=100)
+    parser.add_argument('--with-logging', action='store_true', help="keep ColdFlow's file logging on")
+    parser.add_argument('--results', default=DEFAULT_RESULTS, help="JSON lines file the runs are appended to")
+    parser.add_argument('--no-store', action='store_true', help="do not append this run to the results file")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed rows/s drop before flagging a regression")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    revision = git_revision()
+    regressions = 0
+    for rows in args.rows:
+        config = {
+            "rows": rows,
+            "workers": args.workers,
+            "streaming": args.streaming,
+            "llm_latency": args.llm_latency,
+            "llm_words": args.llm_words,
+            "smtp_latency": args.smtp_latency,
+            "smtp_failure_rate": args.smtp_failure_rate,
+            "smtp_disconnect_rate": args.smtp_disconnect_rate,
+            "attachment_kb": args.attachment_kb,
+            "with_logging": args.with_logging,
+        }
+        result = run(config)
+        baseline = previous_result(args.results, config)
+        regressed = baseline is not None and \
+            result["rows_per_second"] < baseline["result"]["rows_per_second"] * (1 - args.tolerance)
+        regressions += regressed
+        print_result(config, result, baseline, regressed)
+        if not args.no_store:
+            store_result(args.results, {
+                "timestamp": datetime.now().isoformat(timespec='seconds'),
+                "revision": revision,
+                "python": platform.python_version(),
+                "config": config,
+                "result": result,
+            })
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
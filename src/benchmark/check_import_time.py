@@ -0,0 +1,75 @@
+"""
+Import-time budget check for the GUI's startup path.
+
+Imports each module in a fresh interpreter with no ColdFlow credentials set and fails
+(exit status 1) if the median import time exceeds its budget, if the import opens a
+network connection, or if it pulls in the Groq client or pandas, which are only needed
+once a run starts. (numpy is not checked: openpyxl imports it whenever it is installed.)
+
+    python src/benchmark/check_import_time.py [--runs 5]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# module -> (directory added to sys.path, budget in seconds)
+BUDGETS = {
+    "write_excel": (os.path.join(SRC_DIR, 'excel'), 0.5),
+    "main": (SRC_DIR, 1.0),
+}
+FORBIDDEN_MODULES = ("groq", "pandas")
+
+PROBE = r"""
+import json, socket, sys, time
+connections = []
+_connect = socket.socket.connect
+def connect(self, address):
+    connections.append(str(address))
+    return _connect(self, address)
+socket.socket.connect = connect
+sys.path.insert(0, sys.argv[1])
+started = time.perf_counter()
+__import__(sys.argv[2])
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "seconds": elapsed,
+    "connections": connections,
+    "modules": [name for name in sys.argv[3:] if name in sys.modules],
+}))
+"""
+
+
+def measure(module, path):
+    env = {key: value for key, value in os.environ.items() if not key.startswith("COLDFLOW_")}
+    env.pop("GROQ_API_KEY", None)
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, path, module, *FORBIDDEN_MODULES],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[sys.argv.index("--runs") + 1]) if "--runs" in sys.argv else 5
+    failures = []
+    for module, (path, budget) in BUDGETS.items():
+        samples = [measure(module, path) for _ in range(runs)]
+        median = statistics.median(sample["seconds"] for sample in samples)
+        print(f"{module:<12} median {median * 1000:7.1f} ms (budget {budget * 1000:.0f} ms)")
+        if median > budget:
+            failures.append(f"{module} imports in {median:.3f}s, over its {budget}s budget")
+        if samples[0]["connections"]:
+            failures.append(f"{module} opened network connections at import: {samples[0]['connections']}")
+        if samples[0]["modules"]:
+            failures.append(f"{module} imported {', '.join(samples[0]['modules'])} at import time")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
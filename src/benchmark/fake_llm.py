@@ -0,0 +1,76 @@
+"""
+A stand-in for the Groq client with configurable response time and length, so the
+generation stage can be benchmarked without an API key or network access:
+
+    generator.client = FakeGroqClient(latency=0.2, words=180)
+"""
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+_WORDS = ("your", "team", "product", "experience", "growth", "engineering", "impact", "role",
+          "customers", "delivery", "systems", "data", "scale", "reliable", "together", "results")
+
+
+class _Completions:
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, messages, model, stream=False, **kwargs):
+        client = self.client
+        prompt = messages[-1]["content"]
+        with client._lock:
+            client.calls += 1
+            latency = client.latency + client._random.uniform(0, client.jitter)
+            words = [client._random.choice(_WORDS) for _ in range(client.words)]
+        text = "Dear hiring team,\n\n" + " ".join(words) + ".\n\nSincerely,\nColdFlow\n\n" + client.trailer
+        prompt_tokens = max(1, len(prompt) // 4)
+        completion_tokens = max(1, len(text) // 4)
+        if stream:
+            return self._stream(text, model, latency, prompt_tokens, completion_tokens)
+        time.sleep(latency)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=text), finish_reason="stop")],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens),
+        )
+
+    def _stream(self, text, model, latency, prompt_tokens, completion_tokens):
+        """Yield the text a few words per chunk, spread over `latency`, like a streamed completion."""
+        pieces = [piece + " " for piece in text.split(" ")]
+        chunks = [pieces[i:i + 4] for i in range(0, len(pieces), 4)]
+        for chunk in chunks:
+            time.sleep(latency / len(chunks))
+            yield SimpleNamespace(
+                model=model, x_groq=None, usage=None,
+                choices=[SimpleNamespace(delta=SimpleNamespace(content="".join(chunk)), finish_reason=None)],
+            )
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                total_tokens=prompt_tokens + completion_tokens)
+        yield SimpleNamespace(
+            model=model, x_groq=SimpleNamespace(usage=usage), usage=None,
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason="stop")],
+        )
+
+
+class FakeGroqClient:
+    """
+    Answers chat.completions.create after `latency` (+ up to `jitter`) seconds with about
+    `words` words, signed off and followed by `trailer` (the kind of note models append).
+    stream=True yields the answer in chunks over the same time.
+    """
+    def __init__(self, latency=0.2, words=180, jitter=0.0, seed=None,
+                 trailer="Note: feel free to adjust the tone before sending."):
+        self.latency = latency
+        self.words = words
+        self.jitter = jitter
+        self.trailer = trailer
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def close(self):
+        pass
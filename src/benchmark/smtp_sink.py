@@ -0,0 +1,153 @@
+"""
+A local SMTP sink for benchmarks: accepts AUTH and mail from EmailSender (with starttls=False)
+and throws the messages away, with configurable per-message latency and injected failures.
+
+    with SMTPSink(latency=0.02, failure_rate=0.01) as sink:
+        sender = EmailSender('bench@example.com', 'x', '127.0.0.1', sink.port, starttls=False)
+"""
+import random
+import socketserver
+import threading
+import time
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        sink = self.server.sink
+        sink._record("connections")
+        self.reply("220 coldflow-bench ESMTP ready")
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            command = raw.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.reply("250-coldflow-bench")
+                self.reply("250-AUTH PLAIN LOGIN")
+                self.reply("250 8BITMIME")
+            elif verb == 'HELO':
+                self.reply("250 coldflow-bench")
+            elif verb == 'AUTH':
+                self._auth(command)
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self.reply("250 OK")
+            elif verb == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = self._read_data()
+                if size is None:
+                    return
+                outcome = sink._outcome()
+                if outcome == "disconnect":
+                    sink._record("disconnects")
+                    return
+                if outcome == "failure":
+                    sink._record("failures")
+                    self.reply("451 4.3.0 Injected temporary failure")
+                else:
+                    sink._record("messages", bytes_received=size)
+                    self.reply("250 2.0.0 Queued")
+            elif verb == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def _auth(self, command):
+        parts = command.split()
+        mechanism = parts[1].upper() if len(parts) > 1 else ''
+        if mechanism == 'PLAIN' and len(parts) == 2:
+            self.reply("334 ")
+            self.rfile.readline()
+        elif mechanism == 'LOGIN':
+            for _ in range(2 if len(parts) == 2 else 1):
+                self.reply("334 ")
+                self.rfile.readline()
+        if self.server.sink.reject_auth:
+            self.reply("535 5.7.8 Username and Password not accepted")
+        else:
+            self.reply("235 2.7.0 Authentication successful")
+
+    def _read_data(self):
+        size = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return None
+            if line in (b".\r\n", b".\n"):
+                return size
+            size += len(line)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """
+    Threaded SMTP server on `host`:`port` (port 0 picks a free one). Each message waits
+    `latency` seconds before the reply; `failure_rate` of them get a 451 and
+    `disconnect_rate` of them have the connection dropped instead. With reject_auth=True
+    every login fails.
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, failure_rate=0.0, disconnect_rate=0.0,
+                 reject_auth=False, seed=None):
+        self.host = host
+        self.requested_port = port
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.disconnect_rate = disconnect_rate
+        self.reject_auth = reject_auth
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = {"connections": 0, "messages": 0, "failures": 0, "disconnects": 0, "bytes_received": 0}
+        self._server = None
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1] if self._server else None
+
+    def start(self):
+        self._server = _Server((self.host, self.requested_port), _SMTPHandler)
+        self._server.sink = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def _outcome(self):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.disconnect_rate:
+            return "disconnect"
+        if roll < self.disconnect_rate + self.failure_rate:
+            return "failure"
+        return "ok"
+
+    def _record(self, counter, bytes_received=0):
+        with self._lock:
+            self._counts[counter] += 1
+            self._counts["bytes_received"] += bytes_received
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,53 @@
+import random
+from datetime import datetime, timedelta
+
+import openpyxl
+
+HEADER = [None, 'Company_Name', 'Email_Recipient', 'Email_id', 'Send_Count', 'Frequency',
+          'Email_Added_on', 'Last_Email_Date', 'Prompt', 'Subject', 'Content', 'Status']
+
+
+def make_lead_workbook(path, rows, seed=0, content_ratio=0.5, odd_ratio=0.05):
+    """
+    Write a lead sheet laid out like data/cold_email_data.xlsx (blank first row, header on
+    row 2, first column empty) with `rows` synthetic leads. A share of rows (`odd_ratio`)
+    carries the messy values real sheets have: missing or non-numeric counts, invalid dates.
+    """
+    rng = random.Random(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Leads")
+    sheet.append([None] * len(HEADER))
+    sheet.append(HEADER)
+    for i in range(rows):
+        odd = rng.random() < odd_ratio
+        send_count = rng.randint(0, 4)
+        frequency = rng.randint(1, 7)
+        roll = rng.random()
+        if roll < 0.15:
+            last_email_date = None
+        elif roll < 0.55:
+            last_email_date = (today - timedelta(days=rng.randint(0, 10))).strftime('%Y-%m-%d')
+        else:
+            last_email_date = today - timedelta(days=rng.randint(0, 10))
+        if odd:
+            pick = rng.randint(0, 3)
+            if pick == 0:
+                send_count = None
+            elif pick == 1:
+                frequency = 'weekly'
+            elif pick == 2:
+                send_count = str(send_count)
+            else:
+                last_email_date = 'not a date'
+        company = f'Company {i}'
+        sheet.append([
+            None, company, f'Hiring Manager {i}', f'lead{i}@example.com', send_count, frequency,
+            today - timedelta(days=30), last_email_date,
+            f'Write a short cover letter to {company} for an internship. NO PREAMBLE!',
+            'Internship Application',
+            f'Dear Hiring Manager at {company}, ...' if rng.random() < content_ratio else None,
+            None,
+        ])
+    workbook.save(path)
+    return path
@@ -0,0 +1,335 @@
+import asyncio
+import json
+import os
+import smtplib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from send_email import EmailSender
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../logger')))
+from logger import Logger
+
+log = Logger()
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../metrics')))
+from metrics import metrics
+
+# Replies that mean "this account is sending too much", not "this message is bad"
+THROTTLE_CODES = {421, 450, 451, 452, 454}
+THROTTLE_MARKERS = (b"rate", b"quota", b"limit", b"4.7.0", b"5.4.5")
+
+
+class NoAccountAvailable(smtplib.SMTPException):
+    """Every sender account is disabled, out of quota or throttled for longer than max_wait."""
+
+
+class SenderAccount:
+    """
+    One sending identity (address, password and SMTP server) with its own limits: at most
+    `concurrency` messages in flight, `per_minute` messages a minute and `daily_quota` a day.
+    A limit of None means unlimited.
+    """
+    def __init__(self, sender_email, password, smtp_server="smtp.gmail.com", smtp_port=587,
+                 concurrency=2, per_minute=20, daily_quota=500, starttls=True):
+        self.sender_email = sender_email
+        self.concurrency = max(1, int(concurrency))
+        self.per_minute = per_minute
+        self.daily_quota = daily_quota
+        self.sender = EmailSender(sender_email, password, smtp_server, smtp_port,
+                                  pool_size=self.concurrency, starttls=starttls)
+        self.in_flight = 0
+        self.quota_day = date.today()
+        self.sent_today = 0
+        self.throttled_until = 0.0  # time.monotonic() before which the account is skipped
+        self.disabled_reason = None  # Set when the account lost auth; it stays out for the run
+        self._next_slot = 0.0  # Earliest time.monotonic() for the next send under per_minute
+        self._semaphore = None  # Created on the engine's event loop
+
+    def _roll_day(self):
+        today = date.today()
+        if today != self.quota_day:
+            self.quota_day = today
+            self.sent_today = 0
+
+    def quota_left(self):
+        self._roll_day()
+        if self.daily_quota is None:
+            return None
+        return max(0, self.daily_quota - self.sent_today - self.in_flight)
+
+    def usable(self, now):
+        return self.disabled_reason is None and self.quota_left() != 0 and self.throttled_until <= now
+
+    def ready_in(self, now):
+        """Seconds until the rate limit lets this account send again."""
+        return max(0.0, self._next_slot - now)
+
+    def load(self):
+        """Share of the account's concurrency and daily quota already used; lower is preferred."""
+        load = self.in_flight / self.concurrency
+        if self.daily_quota:
+            load += self.sent_today / self.daily_quota
+        return load
+
+    def reserve_slot(self, now):
+        """Claim the next per-minute slot; returns how long to wait for it."""
+        if not self.per_minute:
+            return 0.0
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + 60.0 / self.per_minute
+        return slot - now
+
+
+def quota_state_path(accounts_path):
+    """Where the daily counts for the accounts in `accounts_path` are kept: next to that file."""
+    return os.path.join(os.path.dirname(os.path.abspath(accounts_path)), 'sender_quota.json')
+
+
+def load_accounts(path):
+    """
+    Read sender accounts from a JSON file: a list of objects with sender_email and password
+    and, optionally, smtp_server, smtp_port, concurrency, per_minute, daily_quota, starttls.
+    """
+    with open(path, encoding='utf-8') as accounts_file:
+        entries = json.load(accounts_file)
+    return [SenderAccount(**entry) for entry in entries]
+
+
+class MultiAccountSender:
+    """
+    Spreads sends over several SenderAccounts from an asyncio event loop. Each send goes to
+    the least loaded account that is within its limits; an account that is throttled is
+    rested for `throttle_cooldown` seconds, one that loses auth is dropped for the run, and
+    the message fails over to the next account. Throughput grows with the number of accounts.
+
+    send_email() has the same signature and True/False result as EmailSender.send_email, so a
+    MultiAccountSender can be passed to ColdFlow as its sender; coroutines can use send() and
+    send_many() directly. Daily counts are kept in `state_path` (see quota_state_path) so
+    quotas hold across runs, saved at most every `state_interval` seconds and on close_pool.
+    """
+    def __init__(self, accounts, throttle_cooldown=600.0, max_wait=60.0, state_path=None, state_interval=5.0):
+        if not accounts:
+            raise ValueError("MultiAccountSender needs at least one sender account.")
+        self.accounts = list(accounts)
+        self.throttle_cooldown = throttle_cooldown
+        self.max_wait = max_wait
+        self.state_path = state_path
+        self.state_interval = state_interval
+        self._state_saved = time.monotonic()
+        self._state_saving = False
+        self._loop = None
+        self._thread = None
+        self._executor = None
+        self._start_lock = threading.Lock()
+        self._load_state()
+        log.info(f"MultiAccountSender initialized with {len(self.accounts)} accounts.")
+
+    @property
+    def total_concurrency(self):
+        return sum(account.concurrency for account in self.accounts)
+
+    # -- lifecycle -------------------------------------------------------------------------
+
+    def start(self):
+        """Start the event loop thread (idempotent)."""
+        with self._start_lock:
+            if self._loop is not None:
+                return self._loop
+            self._executor = ThreadPoolExecutor(max_workers=self.total_concurrency, thread_name_prefix="smtp")
+            self._loop = asyncio.new_event_loop()
+            self._loop.set_default_executor(self._executor)
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,), name="smtp-engine", daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._run(self._init_semaphores())
+            return self._loop
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    async def _init_semaphores(self):
+        for account in self.accounts:
+            account._semaphore = asyncio.Semaphore(account.concurrency)
+
+    def open_pool(self, size=None):
+        """Start the engine and keep `concurrency` SMTP sessions per account; `size` is ignored."""
+        self.start()
+        for account in self.accounts:
+            account.sender.open_pool(account.concurrency)
+        return self
+
+    def close_pool(self):
+        """Close every account's SMTP sessions, stop the event loop and save the daily counts."""
+        for account in self.accounts:
+            account.sender.close_pool()
+        with self._start_lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join()
+                self._loop.close()
+                self._executor.shutdown(wait=True)
+                self._loop = self._thread = self._executor = None
+        self._save_state()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    # -- sending ---------------------------------------------------------------------------
+
+    def send_email(self, receiver_email, subject, body, attachment_path=None, raise_errors=False):
+        """Blocking wrapper around send() for thread-based callers such as ColdFlow's pipeline."""
+        self.start()
+        return self._run(self.send(receiver_email, subject, body, attachment_path, raise_errors))
+
+    async def send_many(self, messages):
+        """Send (receiver_email, subject, body, attachment_path) tuples concurrently; returns a bool per message."""
+        return await asyncio.gather(*(self.send(*message) for message in messages))
+
+    async def send(self, receiver_email, subject, body, attachment_path=None, raise_errors=False):
+        """
+        Send one message, failing over between accounts. Returns True once an account accepted
+        it and False if none did; with raise_errors the last failure is raised instead.
+        """
+        tried = set()
+        error = None
+        while True:
+            account = await self._pick_account(tried)
+            if account is None:
+                log.error(f"Failed to send email to {receiver_email}: no sender account available.")
+                if raise_errors:
+                    raise error or NoAccountAvailable("No sender account available.")
+                return False
+            outcome, error = await self._send_with(account, receiver_email, subject, body, attachment_path)
+            if outcome is True:
+                return True
+            if outcome is False:
+                if raise_errors:
+                    raise error
+                return False
+            # The account failed for reasons of its own; let another one try the message
+            tried.add(account)
+            metrics.increment("smtp.failovers")
+
+    async def _pick_account(self, tried):
+        """The least loaded usable account not yet tried, waiting briefly out a throttle if needed."""
+        while True:
+            now = time.monotonic()
+            candidates = [account for account in self.accounts if account not in tried and account.usable(now)]
+            if candidates:
+                return min(candidates, key=lambda account: (account.ready_in(now), account.load()))
+            waiting = [account.throttled_until - now for account in self.accounts
+                       if account not in tried and account.disabled_reason is None
+                       and account.quota_left() != 0 and account.throttled_until > now]
+            if not waiting or min(waiting) > self.max_wait:
+                return None
+            await asyncio.sleep(min(waiting))
+
+    async def _send_with(self, account, receiver_email, subject, body, attachment_path):
+        """
+        Send through one account. Returns (True, None) on success, (False, error) when the
+        message itself was refused and (None, error) when the account should be skipped for
+        this message.
+        """
+        account.in_flight += 1
+        try:
+            async with account._semaphore:
+                delay = account.reserve_slot(time.monotonic())
+                if delay:
+                    await asyncio.sleep(delay)
+                loop = asyncio.get_running_loop()
+                try:
+                    message = account.sender.build_message(receiver_email, subject, body, attachment_path)
+                    await loop.run_in_executor(None, account.sender._send_email, message, receiver_email)
+                except smtplib.SMTPAuthenticationError as e:
+                    account.disabled_reason = f"authentication failed: {e}"
+                    log.error(f"Sender account {account.sender_email} disabled for this run: {e}")
+                    return None, e
+                except smtplib.SMTPRecipientsRefused as e:
+                    log.error(f"Failed to send email to {receiver_email}: recipient refused ({e})")
+                    return False, e
+                except smtplib.SMTPResponseException as e:
+                    if self._is_throttle(e):
+                        self._throttle(account, e)
+                        return None, e
+                    log.error(f"Failed to send email to {receiver_email} via {account.sender_email}: {e}")
+                    return False, e
+                except (smtplib.SMTPException, OSError) as e:
+                    log.warning(f"Sender account {account.sender_email} could not deliver to {receiver_email}: {e}")
+                    return None, e
+                except Exception as e:
+                    log.error(f"Failed to send email to {receiver_email}: {e}", exc_info=True)
+                    return False, e
+        finally:
+            account.in_flight -= 1
+        account.sent_today += 1
+        await self._save_state_soon()
+        log.info(f"Email sent successfully to: {receiver_email} via {account.sender_email}")
+        return True, None
+
+    @staticmethod
+    def _is_throttle(error):
+        message = error.smtp_error if isinstance(error.smtp_error, bytes) else str(error.smtp_error).encode()
+        return error.smtp_code in THROTTLE_CODES or any(marker in message.lower() for marker in THROTTLE_MARKERS)
+
+    def _throttle(self, account, error):
+        message = error.smtp_error if isinstance(error.smtp_error, bytes) else str(error.smtp_error).encode()
+        if b"daily" in message.lower() or b"5.4.5" in message:
+            account.sent_today = max(account.sent_today, account.daily_quota or 0)
+            log.warning(f"Sender account {account.sender_email} reached its daily limit: {error}")
+        else:
+            log.warning(f"Sender account {account.sender_email} throttled for {self.throttle_cooldown}s: {error}")
+        account.throttled_until = time.monotonic() + self.throttle_cooldown
+        metrics.increment("smtp.throttled")
+
+    # -- daily quota state -----------------------------------------------------------------
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, encoding='utf-8') as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError) as e:
+            log.warning(f"Ignoring unreadable sender quota state {self.state_path}: {e}")
+            return
+        today = date.today().isoformat()
+        for account in self.accounts:
+            entry = state.get(account.sender_email)
+            if entry and entry.get("day") == today:
+                account.sent_today = int(entry.get("sent", 0))
+
+    async def _save_state_soon(self):
+        """Save the daily counts from a worker thread, once `state_interval` has passed since the last save."""
+        if not self.state_path or self._state_saving or time.monotonic() - self._state_saved < self.state_interval:
+            return
+        self._state_saving = True
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_state, self._state())
+        finally:
+            self._state_saving = False
+
+    def _state(self):
+        return {account.sender_email: {"day": account.quota_day.isoformat(), "sent": account.sent_today}
+                for account in self.accounts}
+
+    def _save_state(self):
+        self._write_state(self._state())
+
+    def _write_state(self, state):
+        if not self.state_path:
+            return
+        self._state_saved = time.monotonic()
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.state_path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as state_file:
+            json.dump(state, state_file)
+        os.replace(temporary, self.state_path)
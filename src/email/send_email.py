@@ -5,6 +5,9 @@ from email.mime.base import MIMEBase
 from email import encoders
 import os
 import sys
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../logger')))
@@ -12,6 +15,9 @@ from logger import Logger
 
 log = Logger()
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../metrics')))
+from metrics import metrics
+
 def getenv():
     # Load environment variables from .env file
     dotenv_path = os.path.join(os.path.dirname(__file__), '..', 'credentials', 'email.env')
@@ -31,47 +37,288 @@ def getenv():
         
     return sender_email, password
 
+class _PooledConnection:
+    """An authenticated SMTP session plus the bookkeeping the pool needs to recycle it."""
+    def __init__(self, server):
+        self.server = server
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """
+    Keeps up to `size` authenticated SMTP sessions alive and reuses them across sends,
+    so the TLS handshake and AUTH round trips are paid once per connection instead of
+    once per message.
+    """
+    def __init__(self, sender_email, password, smtp_server, smtp_port, size=1,
+                 max_messages_per_connection=100, health_check_after=10.0, timeout=30, starttls=True,
+                 acquire_timeout=60.0):
+        if size < 1:
+            raise ValueError("SMTP pool size must be at least 1.")
+        self.sender_email = sender_email
+        self.password = password
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.size = size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+        self.starttls = starttls
+        # How long acquire() waits for a free connection before raising TimeoutError
+        self.acquire_timeout = acquire_timeout
+        self._idle = []  # Most recently used last, so the warmest session is reused first
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)  # Notified when a connection or slot frees up
+        self._open_connections = 0
+        self._closed = False
+
+    def _connect(self):
+        """Open, secure and authenticate a new SMTP session."""
+        log.info(f"Opening pooled SMTP connection to {self.smtp_server}:{self.smtp_port}")
+        with metrics.timer("smtp.handshake"):
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    server.starttls()
+                server.login(self.sender_email, self.password)
+            except Exception:
+                self._quit(server)
+                raise
+        log.debug("Pooled SMTP connection established and authenticated.")
+        return _PooledConnection(server)
+
+    @staticmethod
+    def _quit(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _is_healthy(self, conn):
+        """Return True if the session is still usable, probing with NOOP when it has been idle."""
+        if conn.messages_sent >= self.max_messages_per_connection:
+            log.debug(f"Recycling SMTP connection after {conn.messages_sent} messages.")
+            return False
+        if time.monotonic() - conn.last_used < self.health_check_after:
+            return True
+        try:
+            code, _ = conn.server.noop()
+            return code == 250
+        except OSError as e:  # SMTPException is an OSError subclass
+            log.debug(f"SMTP NOOP failed, reconnecting: {e}")
+            return False
+
+    def acquire(self, timeout=None):
+        """
+        Take a healthy connection from the pool, opening one if the pool is not yet full.
+        Waits up to `timeout` seconds (default acquire_timeout) for one to free up, then
+        raises TimeoutError; raises RuntimeError once the pool is closed.
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self._available:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("SMTP connection pool is closed.")
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._open_connections < self.size:
+                        self._open_connections += 1
+                        conn = None
+                        break
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"No SMTP connection became free within {timeout}s.")
+                    self._available.wait(remaining)
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._free_slot()
+                    raise
+            if self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def release(self, conn, broken=False):
+        """Return a connection to the pool, or drop it if it is broken or the pool is closed."""
+        with self._available:
+            if not (broken or self._closed):
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+                self._available.notify()
+                return
+        self._discard(conn)
+
+    def _discard(self, conn):
+        self._quit(conn.server)
+        self._free_slot()
+
+    def _free_slot(self):
+        with self._available:
+            self._open_connections -= 1
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception as e:
+            # Refused recipients or data leave the session usable; transport errors do not
+            broken = isinstance(e, smtplib.SMTPServerDisconnected) or (
+                isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException))
+            self.release(conn, broken=broken)
+            raise
+        else:
+            self.release(conn)
+
+    def sendmail(self, receiver_email, message):
+        """Send one message on a pooled connection, reconnecting once if the server dropped the session."""
+        for attempt in range(2):
+            try:
+                with self.connection() as conn:
+                    conn.server.sendmail(self.sender_email, receiver_email, message)
+                    conn.messages_sent += 1
+                    return
+            except smtplib.SMTPServerDisconnected as e:
+                if attempt:
+                    raise
+                log.info(f"SMTP server dropped the session ({e}). Reconnecting.")
+
+    def close(self):
+        """
+        Close every idle connection and wake callers waiting in acquire(), which then raise;
+        connections still in use are closed when released.
+        """
+        with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._available.notify_all()
+        for conn in idle:
+            self._discard(conn)
+        log.info("SMTP connection pool closed.")
+
+
+class AttachmentCache:
+    """
+    Keeps attachments read, base64-encoded and serialized as MIME parts so a campaign that
+    sends the same file to every recipient encodes it once. Entries are keyed by absolute
+    path and invalidated when the file's mtime or size changes.
+    """
+    def __init__(self):
+        self._entries = {}  # abspath -> ((mtime_ns, size), part, serialized part)
+        self._lock = threading.Lock()
+
+    def get(self, attachment_path):
+        """Return (part, serialized_part) for the file, rebuilding them if it changed on disk."""
+        path = os.path.abspath(attachment_path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                return entry[1], entry[2]
+
+        log.debug(f"Encoding attachment: {attachment_path}")
+        with open(path, "rb") as attachment:
+            part = MIMEBase('application', 'octet-stream')
+            part.set_payload(attachment.read())
+        encoders.encode_base64(part)
+        part.add_header('Content-Disposition', f'attachment; filename={os.path.basename(attachment_path)}')
+        serialized = part.as_string()
+        with self._lock:
+            self._entries[path] = (signature, part, serialized)
+        return part, serialized
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+attachment_cache = AttachmentCache()
+
+
 class EmailSender:
-    def __init__(self, sender_email, password, smtp_server="smtp.gmail.com", smtp_port=587):
+    def __init__(self, sender_email, password, smtp_server="smtp.gmail.com", smtp_port=587,
+                 pool_size=1, max_messages_per_connection=100, use_templates=True, starttls=True):
         self.sender_email = sender_email
         self.password = password
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
+        self.pool_size = pool_size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.pool = None
+        # Splice the cached, pre-serialized attachment into each message instead of re-serializing it
+        self.use_templates = use_templates
+        # Only a local relay or test sink should be used without TLS
+        self.starttls = starttls
         log.info(f"EmailSender initialized with sender: {self.sender_email}")
 
-    def send_email(self, receiver_email, subject, body, attachment_path=None):
-        """Send an email with an optional attachment and body content."""
+    def open_pool(self, size=None):
+        """Switch to pooled mode: keep authenticated SMTP sessions alive across send_email calls."""
+        if self.pool is None:
+            self.pool = SMTPConnectionPool(
+                self.sender_email, self.password, self.smtp_server, self.smtp_port,
+                size=size or self.pool_size,
+                max_messages_per_connection=self.max_messages_per_connection,
+                starttls=self.starttls,
+            )
+        return self.pool
+
+    def close_pool(self):
+        """Close every pooled session and go back to one connection per message."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    def send_email(self, receiver_email, subject, body, attachment_path=None, raise_errors=False):
+        """
+        Send an email with an optional attachment and body content. Returns True on success
+        and False on failure, or re-raises the failure if raise_errors is set.
+        """
         log.info(f"Sending email to: {receiver_email}, subject: {subject}")
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.sender_email
-            msg['To'] = receiver_email
-            msg['Subject'] = subject
-            msg.attach(MIMEText(body, 'plain'))
-            log.debug(f"Email body attached: {body}")
-
-            if attachment_path:
-                log.info(f"Attachment path provided: {attachment_path}")
-                self._attach_file(msg, attachment_path)
-
+            msg = self.build_message(receiver_email, subject, body, attachment_path)
             self._send_email(msg, receiver_email)
             log.info(f"Email sent successfully to: {receiver_email}")
             return True
         except Exception as e:
             log.error(f"Failed to send email to {receiver_email}: {e}", exc_info=True)  # Log exception details
+            if raise_errors:
+                raise
             return False
 
+    def build_message(self, receiver_email, subject, body, attachment_path=None):
+        """Build the message from this sender: a Message, or its serialized text when the attachment template is used."""
+        msg = MIMEMultipart()
+        msg['From'] = self.sender_email
+        msg['To'] = receiver_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+        log.debug(f"Email body attached ({len(body)} characters).")
+
+        if attachment_path:
+            log.info(f"Attachment path provided: {attachment_path}")
+            if self.use_templates:
+                msg = self._render_with_attachment(msg, attachment_path)
+            else:
+                self._attach_file(msg, attachment_path)
+        return msg
+
     def _attach_file(self, msg, attachment_path):
         """Attach a file to the email message."""
         log.info(f"Attaching file: {attachment_path}")
         try:
-            with open(attachment_path, "rb") as attachment:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment.read())
-                encoders.encode_base64(part)
-                part.add_header('Content-Disposition', f'attachment; filename={os.path.basename(attachment_path)}')
-                msg.attach(part)
-                log.debug(f"File attached: {attachment_path}")
+            part, _ = attachment_cache.get(attachment_path)
+            msg.attach(part)
+            log.debug(f"File attached: {attachment_path}")
         except FileNotFoundError:
             log.error(f"Attachment file not found: {attachment_path}")
             raise  # Re-raise the exception to be caught in send_email
@@ -79,15 +326,53 @@ class EmailSender:
             log.error(f"Error opening attachment: {e}", exc_info=True)
             raise  # Re-raise the exception
 
+    def _render_with_attachment(self, msg, attachment_path):
+        """
+        Serialize the message (headers and body only) and splice the cached attachment part in
+        before the closing boundary. The result is the same text msg.as_string() would produce
+        with the attachment attached, without re-serializing the attachment for every message.
+        """
+        log.info(f"Attaching file: {attachment_path}")
+        try:
+            part, serialized_part = attachment_cache.get(attachment_path)
+        except FileNotFoundError:
+            log.error(f"Attachment file not found: {attachment_path}")
+            raise
+        message = msg.as_string()
+        closing = f"--{msg.get_boundary()}--"
+        if msg.get_boundary() in serialized_part or closing not in message:
+            msg.attach(part)
+            return msg
+        split_at = message.rindex(closing)
+        return f"{message[:split_at]}--{msg.get_boundary()}\n{serialized_part}\n{message[split_at:]}"
+
     def _send_email(self, msg, receiver_email):
-        """Send the email using SMTP."""
+        """Send the email (a Message or already-serialized text) using SMTP."""
         log.info(f"Sending email via SMTP to: {receiver_email}")
+        message = msg if isinstance(msg, str) else msg.as_string()
         try:
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.sender_email, self.password)
+            if self.pool is not None:
+                with metrics.timer("smtp.send"):
+                    self.pool.sendmail(receiver_email, message)
+                metrics.increment("smtp.messages")
+                metrics.increment("smtp.bytes_sent", len(message))
+                log.debug("Email sent via pooled SMTP connection.")
+                return
+            with metrics.timer("smtp.handshake"):
+                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+                try:
+                    if self.starttls:
+                        server.starttls()
+                    server.login(self.sender_email, self.password)
+                except Exception:
+                    server.close()
+                    raise
+            with server:
                 log.debug("SMTP connection established and authenticated.")
-                server.sendmail(self.sender_email, receiver_email, msg.as_string())
+                with metrics.timer("smtp.send"):
+                    server.sendmail(self.sender_email, receiver_email, message)
+                metrics.increment("smtp.messages")
+                metrics.increment("smtp.bytes_sent", len(message))
                 log.debug("Email sent via SMTP.")
         except smtplib.SMTPAuthenticationError as auth_err:
             log.error(f"SMTP Authentication Error: {auth_err}", exc_info=True)
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from journal import connect_read_only
+
+REF_PREFIX = "body:"  # Email Content cells holding a stored body read "body:<hash>"
+
+
+def is_ref(value):
+    return isinstance(value, str) and value.startswith(REF_PREFIX) and len(value) == len(REF_PREFIX) + 32
+
+
+class BodyStore:
+    """
+    Content-addressed store of generated email bodies, zlib-compressed in SQLite.
+
+    put() stores a body under a hash of its text and returns a short reference
+    ("body:<32 hex>") to keep in the Email Content cell in place of the text, so the
+    workbook, and every load and save of it, stays small. Identical bodies are stored once.
+    """
+    def __init__(self, path=os.path.join('data', 'coldflow_bodies.sqlite3'), level=6, read_only=False):
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+        if read_only:  # Inspection only, e.g. a dry run; the file must exist
+            self._conn = connect_read_only(path)
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bodies ("
+            " hash TEXT PRIMARY KEY, body BLOB NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_ref(text):
+        return REF_PREFIX + hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+    def put(self, text):
+        """Store `text` (if not already stored) and return its reference."""
+        ref = self.make_ref(text)
+        raw = text.encode("utf-8")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO bodies (hash, body, size, created) VALUES (?, ?, ?, ?)",
+                (ref[len(REF_PREFIX):], zlib.compress(raw, self.level), len(raw), time.time()),
+            )
+            self._conn.commit()
+        return ref
+
+    def get(self, ref):
+        """The body for `ref`; KeyError if it is not in the store."""
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM bodies WHERE hash = ?", (ref[len(REF_PREFIX):],)).fetchone()
+        if row is None:
+            raise KeyError(f"Email body {ref} is not in {self.path}.")
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def __contains__(self, ref):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM bodies WHERE hash = ?", (ref[len(REF_PREFIX):],)
+            ).fetchone() is not None
+
+    def resolve(self, value):
+        """The body text for an Email Content cell: looked up if it holds a reference, else as is."""
+        return self.get(value) if is_ref(value) else value
+
+    def stats(self):
+        with self._lock:
+            entries, size, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(body)), 0) FROM bodies"
+            ).fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "stored_bytes": stored,
+            "ratio": round(stored / size, 3) if size else None,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,30 @@
+from datetime import date, datetime, timedelta
+
+
+def parse_last_email_date(last_email_date_raw):
+    """Return a Last_Email_Date cell as a date, or None if it is empty or not YYYY-MM-DD."""
+    if last_email_date_raw is None:
+        return None
+    if isinstance(last_email_date_raw, datetime):
+        return last_email_date_raw.date()
+    try:
+        return datetime.strptime(str(last_email_date_raw).split()[0], '%Y-%m-%d').date()
+    except (ValueError, AttributeError, IndexError):
+        return None
+
+
+def next_due_date(send_count, frequency, last_email_date_raw):
+    """
+    First day a row's next email is due: None if it will never be due (Send_Count not
+    above 1), date.min if it is due right away (missing or invalid Last_Email_Date),
+    otherwise Last_Email_Date + Frequency days.
+    """
+    if send_count <= 1:
+        return None
+    last_email_date = parse_last_email_date(last_email_date_raw)
+    if last_email_date is None:
+        return date.min
+    try:
+        return last_email_date + timedelta(days=frequency)
+    except OverflowError:
+        return date.min if frequency < 0 else date.max
@@ -0,0 +1,83 @@
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+
+def connect_read_only(path):
+    """
+    A read-only connection to the existing SQLite file at `path` that creates no files next
+    to it: immutable when it has no -wal file (closed cleanly), otherwise read-only
+    alongside the writer's own -wal and -shm files.
+    """
+    query = "?mode=ro" if os.path.exists(path + "-wal") else "?mode=ro&immutable=1"
+    return sqlite3.connect(pathlib.Path(path).resolve().as_uri() + query, uri=True, check_same_thread=False)
+
+
+class SendJournal:
+    """
+    Append-only journal of committed sends, stored in a SQLite table in WAL mode.
+
+    Each successful send is recorded with the cell updates it implies before those updates
+    reach the workbook. Once a save has merged them into the xlsx, the entries are
+    checkpointed (deleted). Entries still in the journal at startup belong to a run that
+    stopped before saving and are replayed into the workbook.
+    """
+    def __init__(self, path=os.path.join('data', 'coldflow_journal.sqlite3'), read_only=False):
+        self.path = path
+        self._lock = threading.Lock()
+        if read_only:  # Inspection only, e.g. a dry run; the file must exist
+            self._conn = connect_read_only(path)
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sends ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, workbook TEXT NOT NULL, sheet TEXT NOT NULL,"
+            " row INTEGER NOT NULL, email_id TEXT, changes TEXT NOT NULL, sent_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sends_workbook ON sends (workbook, sheet, id)")
+        self._conn.commit()
+
+    @staticmethod
+    def workbook_key(excel_file_path):
+        return os.path.normcase(os.path.abspath(excel_file_path))
+
+    def record(self, workbook, sheet, row, email_id, changes):
+        """Durably append one send and its cell updates; returns the entry id."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO sends (workbook, sheet, row, email_id, changes, sent_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (workbook, sheet, row, email_id, json.dumps(changes), time.time()),
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    def pending(self, workbook, sheet):
+        """Entries not yet merged into the workbook, oldest first, as (id, row, {column: value})."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, row, changes FROM sends WHERE workbook = ? AND sheet = ? ORDER BY id",
+                (workbook, sheet),
+            ).fetchall()
+        return [(entry_id, row, {int(column): value for column, value in json.loads(changes).items()})
+                for entry_id, row, changes in rows]
+
+    def checkpoint(self, workbook, sheet, entry_ids):
+        """Forget the given entries once the workbook on disk contains their updates."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM sends WHERE workbook = ? AND sheet = ? AND id = ?",
+                [(workbook, sheet, entry_id) for entry_id in entry_ids],
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from eligibility import parse_last_email_date
+
+
+def _scalar_int(value):
+    """int() as process_excel_sheet applies it; NaN where that conversion fails."""
+    try:
+        return float(int(value))
+    except (TypeError, ValueError, OverflowError):
+        return np.nan
+
+
+def _int_column(values):
+    """
+    Convert a Send_Count/Frequency column with int() semantics, vectorized for the usual
+    case of numeric cells. Strings and other odd values go through int() one by one so
+    the result matches the row-by-row code exactly.
+    """
+    series = pd.Series(values, dtype=object)
+    kinds = series.map(type)
+    numeric = kinds.isin((int, float, bool))
+    result = np.full(len(series), np.nan)
+    if numeric.any():
+        converted = pd.to_numeric(series[numeric], errors="coerce").to_numpy(dtype=float)
+        result[numeric.to_numpy()] = np.where(np.isfinite(converted), np.trunc(converted), np.nan)
+    odd = (~numeric & series.notna()).to_numpy()
+    for position in np.flatnonzero(odd):
+        result[position] = _scalar_int(values[position])
+    return result
+
+
+def _days_since_column(values, today):
+    """
+    Days from each Last_Email_Date to `today`; NaN where the date is missing or invalid
+    (process_excel_sheet sends in both cases). Strings are parsed like the row-by-row
+    code: first whitespace-separated token as YYYY-MM-DD.
+    """
+    series = pd.Series(values, dtype=object)
+    days = np.full(len(series), np.nan)
+    is_datetime = series.map(lambda value: isinstance(value, datetime)).to_numpy()
+    is_string = series.map(lambda value: isinstance(value, str)).to_numpy()
+    today_day = np.datetime64(today, "D")
+
+    if is_datetime.any():
+        stamps = np.array([value.date() for value in series[is_datetime]], dtype="datetime64[D]")
+        days[is_datetime] = (today_day - stamps).astype(float)
+
+    leftovers = ~is_datetime & series.notna().to_numpy()
+    if is_string.any():
+        tokens = series[is_string].str.split().str[0]
+        parsed = pd.to_datetime(tokens, format="%Y-%m-%d", errors="coerce")
+        ok = parsed.notna().to_numpy()
+        string_positions = np.flatnonzero(is_string)
+        days[string_positions[ok]] = (
+            today_day - parsed[ok].to_numpy().astype("datetime64[D]")
+        ).astype(float)
+        leftovers[string_positions[ok]] = False
+
+    # Anything pandas could not parse gets the exact scalar rule
+    for position in np.flatnonzero(leftovers):
+        last_email_date = parse_last_email_date(values[position])
+        if last_email_date is not None:
+            days[position] = (today - last_email_date).days
+    return days
+
+
+def due_mask(send_counts, frequencies, last_email_dates, today=None):
+    """
+    Vectorized form of process_excel_sheet's eligibility check: a row is due when
+    Send_Count and Frequency convert to int, Send_Count > 1, and Last_Email_Date is
+    missing, invalid, or at least Frequency days before `today`.
+    """
+    today = today or datetime.now().date()
+    send_count = _int_column(send_counts)
+    frequency = _int_column(frequencies)
+    days_since = _days_since_column(last_email_dates, today)
+    valid = ~np.isnan(send_count) & ~np.isnan(frequency)
+    with np.errstate(invalid="ignore"):
+        return valid & (send_count > 1) & (np.isnan(days_since) | (days_since >= frequency))
+
+
+def plan_due_rows(sheet, first_row=2, today=None):
+    """
+    Load the Send_Count, Frequency and Last_Email_Date columns (E, F, H) once and
+    return the Excel row numbers that are due, in sheet order.
+    """
+    columns = list(sheet.iter_rows(min_row=first_row, min_col=5, max_col=8, values_only=True))
+    if not columns:
+        return []
+    send_counts, frequencies, _, last_email_dates = (list(column) for column in zip(*columns))
+    mask = due_mask(send_counts, frequencies, last_email_dates, today)
+    return (np.flatnonzero(mask) + first_row).tolist()
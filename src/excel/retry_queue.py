@@ -0,0 +1,146 @@
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from journal import connect_read_only
+
+TRANSIENT = "transient"
+PERMANENT = "permanent"
+
+# HTTP statuses from the LLM API worth retrying: timeouts, conflicts, rate limits, server errors
+_RETRYABLE_HTTP = {408, 409, 429}
+# SMTP replies that mean "not now" even though they are 5xx: auth hiccups and sending quotas
+_RETRYABLE_SMTP_MARKERS = (b"5.4.5", b"quota", b"rate limit", b"try again")
+
+
+def _smtp_reply_is_transient(code, message):
+    if 400 <= code < 500:
+        return True
+    if code in (530, 534, 535):  # Authentication: a credentials problem, not this recipient's
+        return True
+    message = message if isinstance(message, bytes) else str(message).encode()
+    return any(marker in message.lower() for marker in _RETRYABLE_SMTP_MARKERS)
+
+
+def classify_failure(error):
+    """
+    TRANSIENT for failures worth retrying later (Groq 429/5xx, timeouts and connection
+    errors, SMTP 4xx replies and dropped sessions), PERMANENT for ones that will fail the same
+    way again (e.g. a rejected prompt or a refused recipient). Unknown errors count as transient;
+    the retry limit bounds them. An error can decide for itself with a `permanent` attribute.
+    """
+    permanent = getattr(error, "permanent", None)
+    if isinstance(permanent, bool):
+        return PERMANENT if permanent else TRANSIENT
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        replies = list(error.recipients.values())
+        if replies and all(not _smtp_reply_is_transient(code, message) for code, message in replies):
+            return PERMANENT
+        return TRANSIENT
+    if isinstance(error, smtplib.SMTPResponseException):
+        return TRANSIENT if _smtp_reply_is_transient(error.smtp_code, error.smtp_error) else PERMANENT
+    if isinstance(error, (smtplib.SMTPException, OSError)):
+        return TRANSIENT
+    status_code = getattr(error, "status_code", None)  # groq.APIStatusError and friends
+    if isinstance(status_code, int):
+        if status_code in _RETRYABLE_HTTP or status_code >= 500 or status_code in (401, 403):
+            return TRANSIENT
+        return PERMANENT
+    return TRANSIENT
+
+
+def retry_after_hint(error):
+    """Seconds the server asked us to wait (a Retry-After header on an API error), if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base_delay, max_delay, rng=random):
+    """Jittered exponential backoff: a random delay in [base, min(max, base * 2**(attempt-1))]."""
+    ceiling = min(max_delay, base_delay * 2 ** max(0, attempt - 1))
+    return rng.uniform(min(base_delay, ceiling), ceiling)
+
+
+class RetryQueue:
+    """
+    Rows whose generation or send failed transiently, with the time each may be tried again,
+    stored in SQLite (WAL mode) so deferrals survive restarts. Each deferral waits a jittered,
+    exponentially growing delay; after `max_attempts` the row is given up on.
+    """
+    def __init__(self, path=os.path.join('data', 'coldflow_retry.sqlite3'), base_delay=60.0,
+                 max_delay=6 * 3600.0, max_attempts=6, read_only=False):
+        self.path = path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        if read_only:  # Inspection only, e.g. a dry run; the file must exist
+            self._conn = connect_read_only(path)
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS retries ("
+            " workbook TEXT NOT NULL, sheet TEXT NOT NULL, row INTEGER NOT NULL, stage TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL, retry_at REAL NOT NULL, last_error TEXT,"
+            " PRIMARY KEY (workbook, sheet, row))"
+        )
+        self._conn.commit()
+
+    def defer(self, workbook, sheet, row, stage, error, min_delay=None):
+        """
+        Count a failed attempt for the row and schedule the next one. Returns the retry time
+        as a datetime, or None once the row has used up max_attempts (its entry is removed).
+        """
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT attempts FROM retries WHERE workbook = ? AND sheet = ? AND row = ?",
+                (workbook, sheet, row),
+            ).fetchone()
+            attempts = (existing[0] if existing else 0) + 1
+            if attempts >= self.max_attempts:
+                self._conn.execute("DELETE FROM retries WHERE workbook = ? AND sheet = ? AND row = ?",
+                                   (workbook, sheet, row))
+                self._conn.commit()
+                return None
+            delay = max(backoff_delay(attempts, self.base_delay, self.max_delay), min_delay or 0)
+            retry_at = time.time() + delay
+            self._conn.execute(
+                "INSERT OR REPLACE INTO retries (workbook, sheet, row, stage, attempts, retry_at, last_error)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (workbook, sheet, row, stage, attempts, retry_at, str(error)[:500]),
+            )
+            self._conn.commit()
+        return datetime.fromtimestamp(retry_at)
+
+    def pending(self, workbook, sheet):
+        """Deferred rows of a sheet as {excel_row: retry datetime}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row, retry_at FROM retries WHERE workbook = ? AND sheet = ?", (workbook, sheet)
+            ).fetchall()
+        return {row: datetime.fromtimestamp(retry_at) for row, retry_at in rows}
+
+    def clear(self, workbook, sheet, row):
+        """Forget a row once it was sent or failed for good."""
+        with self._lock:
+            self._conn.execute("DELETE FROM retries WHERE workbook = ? AND sheet = ? AND row = ?",
+                               (workbook, sheet, row))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,167 @@
+import csv
+import math
+import os
+from datetime import timedelta
+
+import numpy as np
+
+from planner import _days_since_column, _int_column
+
+
+def simulate_campaign(send_counts, frequencies, last_email_dates, needs_content, prompt_tokens, start,
+                      days=30, not_before=None, run_hours=24.0, sends_per_minute=None, daily_send_quota=None,
+                      requests_per_minute=30, tokens_per_minute=6000, completion_tokens=400,
+                      generate_workers=4, send_workers=4, llm_seconds=2.0, smtp_seconds=0.5):
+    """
+    Project a campaign day by day from `start` without sending anything.
+
+    Rows become due by process_excel_sheet's rule (Send_Count above 1, Last_Email_Date
+    missing, invalid or at least Frequency days back; `not_before` holds a day offset per
+    row, e.g. a retry time, or None). Each simulated day ColdFlow runs for `run_hours` and
+    sends due rows in sheet order until a limit is reached:
+
+    - sends: `sends_per_minute` over the run, and `daily_send_quota`;
+    - LLM: `requests_per_minute` and `tokens_per_minute` over the run, charged only for rows
+      without content (`needs_content`), at `prompt_tokens` + `completion_tokens` each;
+    - time: `generate_workers` generations of `llm_seconds` and `send_workers` sends of
+      `smtp_seconds` in parallel, the two stages overlapping as in the pipeline, and no
+      faster than the send, request and token rates above allow.
+
+    A send lowers the row's Send_Count, makes it due again Frequency days later (the next
+    day at the earliest) and keeps its content. Rows left over stay in the backlog.
+
+    Returns (schedule, summary): one dict per day and the campaign totals.
+    """
+    send_count = _int_column(send_counts)
+    frequency = _int_column(frequencies)
+    days_since = _days_since_column(last_email_dates, start)
+    valid = ~np.isnan(send_count) & ~np.isnan(frequency)
+    remaining = np.where(valid & (send_count > 1), send_count - 1, 0)
+    with np.errstate(invalid="ignore"):
+        due_day = np.where(np.isnan(days_since), 0, np.maximum(frequency - days_since, 0))
+    if not_before is not None:
+        due_day = np.maximum(due_day, np.asarray(not_before, dtype=float))
+    step = np.maximum(np.nan_to_num(frequency, nan=1.0), 1)
+    needs_content = np.asarray(needs_content, dtype=bool).copy()
+    tokens = np.asarray(prompt_tokens, dtype=float) + completion_tokens
+
+    run_minutes = run_hours * 60
+    run_seconds = run_minutes * 60
+    send_cap = math.inf
+    if sends_per_minute:
+        send_cap = sends_per_minute * run_minutes
+    if daily_send_quota:
+        send_cap = min(send_cap, daily_send_quota)
+    request_cap = requests_per_minute * run_minutes if requests_per_minute else math.inf
+    token_cap = tokens_per_minute * run_minutes if tokens_per_minute else math.inf
+
+    schedule = []
+    total_sent = 0
+    for day in range(days):
+        if not remaining.any():
+            break
+        due = np.flatnonzero((remaining > 0) & (due_day <= day))
+        generate = needs_content[due]
+        cumulative_generations = np.cumsum(generate)
+        cumulative_tokens = np.cumsum(np.where(generate, tokens[due], 0))
+        cumulative_sends = np.arange(1, len(due) + 1)
+        cumulative_seconds = np.maximum(cumulative_generations * llm_seconds / generate_workers,
+                                        cumulative_sends * smtp_seconds / send_workers)
+        # The rate limiters pace the run too: it cannot go faster than any of its budgets
+        for done, per_minute in ((cumulative_sends, sends_per_minute),
+                                 (cumulative_generations, requests_per_minute),
+                                 (cumulative_tokens, tokens_per_minute)):
+            if per_minute:
+                cumulative_seconds = np.maximum(cumulative_seconds, done * 60.0 / per_minute)
+        fits = {
+            "send quota": min(len(due), send_cap),
+            "LLM requests": np.searchsorted(cumulative_generations, request_cap, side="right"),
+            "LLM tokens": np.searchsorted(cumulative_tokens, token_cap, side="right"),
+            "run time": np.searchsorted(cumulative_seconds, run_seconds, side="right"),
+        }
+        limit = min(fits, key=fits.get)
+        count = int(fits[limit])
+        sent = due[:count]
+        remaining[sent] -= 1
+        due_day[sent] = day + step[sent]
+        needs_content[sent] = False
+        total_sent += count
+        schedule.append({
+            "date": (start + timedelta(days=day)).isoformat(),
+            "due": len(due),
+            "sent": count,
+            "generated": int(cumulative_generations[count - 1]) if count else 0,
+            "tokens": int(cumulative_tokens[count - 1]) if count else 0,
+            "run_hours": round(float(cumulative_seconds[count - 1]) / 3600, 2) if count else 0.0,
+            "backlog": len(due) - count,
+            "limited_by": limit if count < len(due) else None,
+            "total_sent": total_sent,
+        })
+
+    limited = [entry for entry in schedule if entry["limited_by"]]
+    finished = not remaining.any()
+    summary = {
+        "start": start.isoformat(),
+        "days_simulated": len(schedule),
+        "rows": len(remaining),
+        "sends": total_sent,
+        "generations": sum(entry["generated"] for entry in schedule),
+        "tokens": sum(entry["tokens"] for entry in schedule),
+        "peak_backlog": max((entry["backlog"] for entry in schedule), default=0),
+        "first_limited_day": limited[0]["date"] if limited else None,
+        "first_limited_by": limited[0]["limited_by"] if limited else None,
+        "finished_on": schedule[-1]["date"] if finished and schedule else None,
+        "sends_pending": int(remaining.sum()),
+    }
+    return schedule, summary
+
+
+def write_schedule(schedule, path):
+    """Write the per-day schedule as CSV."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as schedule_file:
+        writer = csv.DictWriter(schedule_file, fieldnames=list(schedule[0]) if schedule else ["date"])
+        writer.writeheader()
+        writer.writerows(schedule)
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import date
+
+    from write_excel import ColdFlow  # type: ignore
+
+    parser = argparse.ArgumentParser(description="Project a ColdFlow campaign day by day without sending anything.")
+    parser.add_argument("workbook")
+    parser.add_argument("--sheet", default=None, help="sheet to simulate (default: the active one)")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="first simulated day, YYYY-MM-DD (default: today)")
+    parser.add_argument("--run-hours", type=float, default=24.0, help="hours ColdFlow runs each day")
+    parser.add_argument("--sends-per-minute", type=float, default=None)
+    parser.add_argument("--daily-send-quota", type=int, default=None, help="e.g. 500 for one Gmail account")
+    parser.add_argument("--requests-per-minute", type=float, default=30)
+    parser.add_argument("--tokens-per-minute", type=float, default=6000)
+    parser.add_argument("--completion-tokens", type=int, default=400, help="expected tokens per generated email")
+    parser.add_argument("--generate-workers", type=int, default=4)
+    parser.add_argument("--send-workers", type=int, default=4)
+    parser.add_argument("--llm-seconds", type=float, default=2.0, help="time per generation")
+    parser.add_argument("--smtp-seconds", type=float, default=0.5, help="time per send")
+    parser.add_argument("--report", default=None, help="CSV file for the per-day schedule")
+    args = parser.parse_args()
+
+    coldflow = ColdFlow(args.workbook, sheet_name=args.sheet, dry_run=True)
+    schedule, summary = coldflow.simulate(
+        days=args.days, start=args.start, report_path=args.report, run_hours=args.run_hours,
+        sends_per_minute=args.sends_per_minute, daily_send_quota=args.daily_send_quota,
+        requests_per_minute=args.requests_per_minute, tokens_per_minute=args.tokens_per_minute,
+        completion_tokens=args.completion_tokens, generate_workers=args.generate_workers,
+        send_workers=args.send_workers, llm_seconds=args.llm_seconds, smtp_seconds=args.smtp_seconds,
+    )
+    print(f"{'date':<12}{'due':>9}{'sent':>9}{'generated':>11}{'tokens':>11}{'hours':>7}{'backlog':>9}  limited by")
+    for entry in schedule:
+        print(f"{entry['date']:<12}{entry['due']:>9}{entry['sent']:>9}{entry['generated']:>11}{entry['tokens']:>11}"
+              f"{entry['run_hours']:>7}{entry['backlog']:>9}  {entry['limited_by'] or '-'}")
+    print(summary)
@@ -1,143 +1,747 @@
 import sys
 import os
+import threading
+import time
 import openpyxl
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
 
 # Add logger directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../logger')))
 from logger import Logger
 log = Logger()
 
-# Add llm directory to sys.path
+# Add llm and email directories to sys.path; their modules are imported on first use
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../llm')))
-from generate_content import CoverLetterGenerator  # type: ignore
-generator = CoverLetterGenerator()
-
-# Add email directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../email')))
-from send_email import EmailSender, getenv  # type: ignore
-sender_email, password = getenv()
-es = EmailSender(sender_email, password)
 attachment_path = "src/resume/document.pdf"
+from prompt_template import PromptTemplate, variable_name  # type: ignore
+from rate_limiter import Cancelled  # type: ignore
+
+# Add metrics directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../metrics')))
+from metrics import metrics  # type: ignore
+
+# Add pipeline directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../pipeline')))
+from pipeline import Pipeline, Stage  # type: ignore
+
+from journal import SendJournal  # type: ignore
+from body_store import BodyStore, is_ref  # type: ignore
+from retry_queue import PERMANENT, RetryQueue, classify_failure, retry_after_hint  # type: ignore
+from eligibility import next_due_date, parse_last_email_date  # type: ignore
+
+_defaults_lock = threading.Lock()
+_default_generators = {}  # generation cache path -> (api key, CoverLetterGenerator)
+_default_sender = None  # ((address, password), EmailSender)
+_default_rate_limiter = None  # LLM budget of the default generators; the first one's own until shared
+
+def share_rate_limiter(rate_limiter):
+    """
+    Make the default generators draw on `rate_limiter` (e.g. a SharedRateLimiter, for one
+    LLM budget across processes), whether they have been built yet or not.
+    """
+    global _default_rate_limiter
+    with _defaults_lock:
+        _default_rate_limiter = rate_limiter
+        if rate_limiter is not None:
+            for _, generator in _default_generators.values():
+                generator.rate_limiter = rate_limiter
+
+def default_generator(cache_path):
+    """
+    The CoverLetterGenerator with the on-disk generation cache at `cache_path`, built on first
+    use so that importing this module needs no API key and does not import the Groq client.
+    All default generators share one rate limiter across ColdFlow instances; each is
+    rebuilt if the API key in the environment changes.
+    """
+    global _default_rate_limiter
+    with _defaults_lock:
+        api_key = os.getenv('COLDFLOW_GROQ_API_KEY')
+        entry = _default_generators.get(cache_path)
+        if entry is None or (api_key and api_key != entry[0]):
+            from generate_content import CoverLetterGenerator  # type: ignore
+            from cache import GenerationCache  # type: ignore
+            generator = CoverLetterGenerator(cache=GenerationCache(cache_path), rate_limiter=_default_rate_limiter)
+            _default_rate_limiter = generator.rate_limiter
+            entry = _default_generators[cache_path] = (api_key, generator)
+        return entry[1]
+
+def default_sender():
+    """
+    The process-wide sender, built on first use: a MultiAccountSender over the accounts in
+    the JSON file named by COLDFLOW_SENDER_ACCOUNTS if that is set, otherwise an EmailSender
+    for the environment credentials.
+    """
+    global _default_sender
+    with _defaults_lock:
+        accounts_path = os.getenv('COLDFLOW_SENDER_ACCOUNTS')
+        if accounts_path:
+            if _default_sender is None or _default_sender[0] != accounts_path:
+                from multi_sender import MultiAccountSender, load_accounts, quota_state_path  # type: ignore
+                _default_sender = (accounts_path, MultiAccountSender(load_accounts(accounts_path),
+                                                                     state_path=quota_state_path(accounts_path)))
+            return _default_sender[1]
+        from send_email import EmailSender, getenv  # type: ignore
+        credentials = getenv()
+        if _default_sender is None or credentials != _default_sender[0]:
+            _default_sender = (credentials, EmailSender(*credentials))
+        return _default_sender[1]
+
+SENT_STATUS = "Email Sent."
+FAILED_STATUS = "Email Failed"  # Followed by the reason; rows with this status are not retried
+RETRY_STATUS = "Retry Scheduled"  # Followed by the time of the next attempt
 
 class ColdFlow:
-    def __init__(self, excel_file_path):
+    def __init__(self, excel_file_path, streaming=False, journal=None, checkpoint_interval=300.0,
+                 generator=None, sender=None, retry_queue=None, stop_event=None, stop_timeout=10.0,
+                 prompt_template=None, prefix_window=256, body_store=None, inline_bodies=False,
+                 sheet_name=None, send_limiter=None, dry_run=False):
+        """
+        Load the sheet `sheet_name` (default: the active one) of the workbook. Unless dry_run
+        is set, this starts a new run in the shared metrics registry; see write_run_report.
+        """
         self.excel_file_path = excel_file_path
+        self.streaming = streaming  # Read-only load; changes are written back in one pass by save_workbook
+        # Default to default_generator()/default_sender(), built when a row first needs them
+        self._generator = generator
+        self._sender = sender
         self.workbook = None
         self.sheet = None
+        self.pipeline_report = None
+        self.sent_rows = {}  # Rows sent by the last process_excel_sheet call: {excel_row: next_due}
+        self.changes = {}  # Pending sheet updates: {excel_row: {column: value}}
+        self.dry_run = dry_run  # Read-only inspection (simulate): nothing is sent or saved, metrics are left alone
+        # The default journal, retry queue and body store are SQLite files beside the workbook.
+        # Sends are journaled as they happen and replayed after a crash (see _replay_journal);
+        # rows that failed transiently wait out their backoff on the retry queue.
+        self.journal = journal if journal is not None else self._side_store(SendJournal, 'coldflow_journal.sqlite3')
+        self.retry_queue = retry_queue if retry_queue is not None else self._side_store(RetryQueue, 'coldflow_retry.sqlite3')
+        self.body_store = body_store if body_store is not None else self._side_store(BodyStore, 'coldflow_bodies.sqlite3')
+        self.inline_bodies = inline_bodies  # Write bodies into the sheet instead of body store references
+        self.send_limiter = send_limiter  # Caps sends on top of the sender's limits; may be a SharedRateLimiter
+        self.deferred_rows = {}  # Rows waiting on the retry queue: {excel_row: retry datetime}
+        self.checkpoint_interval = checkpoint_interval  # Seconds between journal merges into the xlsx; None: on save only
+        self.journaled_rows = set()  # Rows already sent according to the journal
+        self._applied_journal_ids = []  # Journal entries whose updates are in the change log
+        self._last_checkpoint = time.monotonic()
+        self._pool_lock = threading.Lock()
+        self._pool_open = False  # Sender pool opened by this run's first send
+        self._pool_size = None
+        self._sheet_lock = threading.RLock()  # Keeps checkpoint saves from racing the row reader
+        self.stop_event = stop_event if stop_event is not None else threading.Event()  # See stop(); one per run
+        self.stop_timeout = stop_timeout
+        if prompt_template is None and os.getenv('COLDFLOW_PROMPT_TEMPLATE'):
+            prompt_template = PromptTemplate.load(os.getenv('COLDFLOW_PROMPT_TEMPLATE'))
+        self.prompt_template = prompt_template  # Renders each row's prompt; its preamble is the system message
+        self.prefix_window = prefix_window  # See _prefix_ordered
+        self._variable_names = None  # Placeholder name per column, from the header row
+        self._generation_lock = threading.Lock()
+        self._generations = OrderedDict()  # (system, prompt, model) -> Future, for deduplication
+        if dry_run:
+            self.streaming = streaming = True  # Read-only load
+        else:
+            metrics.reset()
         try:
-            self.workbook = openpyxl.load_workbook(self.excel_file_path)
-            self.sheet = self.workbook.active
+            started = time.perf_counter()
+            self.workbook = openpyxl.load_workbook(self.excel_file_path, read_only=streaming)
+            if not dry_run:
+                metrics.observe("excel.load", time.perf_counter() - started)
+            self.sheet = self.workbook[sheet_name] if sheet_name else self.workbook.active
             log.info(f"Loaded workbook: {self.excel_file_path}, sheet: {self.sheet.title}")
         except FileNotFoundError:
             log.error(f"Error: Excel file not found at {self.excel_file_path}")
         except Exception as e:
             log.error(f"Error loading workbook: {e}", exc_info=True)
+        if self.sheet:
+            if self.journal is not None:
+                self._replay_journal()
+            if self.retry_queue is not None:
+                self.deferred_rows = self.retry_queue.pending(*self._journal_key())
+
+    def _side_path(self, name):
+        return os.path.join(os.path.dirname(os.path.abspath(self.excel_file_path)), name)
 
-    def process_excel_sheet(self):
+    def _side_store(self, store_class, name):
+        """
+        The default side store `name`, next to the workbook so it is found whatever the
+        working directory. A dry run only reads an existing one and otherwise goes without.
+        """
+        path = self._side_path(name)
+        if not self.dry_run:
+            return store_class(path)
+        return store_class(path, read_only=True) if os.path.exists(path) else None
+
+    @property
+    def generator(self):
+        if self._generator is None:
+            self._generator = default_generator(self._side_path('generation_cache.sqlite3'))
+        return self._generator
+
+    @property
+    def sender(self):
+        if self._sender is None:
+            self._sender = default_sender()
+        return self._sender
+
+    def _journal_key(self):
+        return SendJournal.workbook_key(self.excel_file_path), self.sheet.title
+
+    def _replay_journal(self):
+        """
+        Merge sends journaled by an interrupted run into the workbook. Those rows are skipped
+        only until the merge is saved; after that the sheet reflects the sends and the
+        normal eligibility rule applies to them.
+        """
+        entries = self.journal.pending(*self._journal_key())
+        if not entries:
+            return
+        log.info(f"Replaying {len(entries)} journaled sends from an interrupted run.")
+        for entry_id, row, changes in entries:
+            for column, value in changes.items():
+                self.update_cell(row, column, value)
+            self.journaled_rows.add(row)
+            self._applied_journal_ids.append(entry_id)
+        if self.dry_run:  # The change log is enough for inspection; the file stays untouched
+            return
+        if self.save_workbook():
+            self.journaled_rows.clear()
+
+    def process_excel_sheet(self, workers=4, stage_workers=None, queue_size=16, only_rows=None, plan=True):
         """
         Iterates through each row (skipping header, excluding first column),
         processes emails, and updates the Excel sheet.
+
+        Rows flow through a read -> generate -> send -> write pipeline. `workers` sets the
+        generate and send worker counts (the send stage gets at least the total concurrency
+        of a multi-account sender; override per stage with `stage_workers`); sheet
+        updates always run on one worker. workers=1 processes one row at a time on the
+        calling thread. `only_rows` limits the pass to those Excel rows; otherwise, in full
+        edit mode with plan=True, a vectorized planning pass (plan_due_rows) picks them so
+        only due rows are parsed. Returns the per-stage pipeline report.
         """
         if not self.sheet:
             log.error("Sheet not loaded. Cannot process.")
             return
+        if self.dry_run:
+            log.error("A dry-run ColdFlow does not send; use simulate() instead.")
+            return
+
+        counts = {"generate": workers, "send": workers, "write": 1}
+        counts["send"] = self._send_concurrency(workers)
+        counts.update(stage_workers or {})
+        counts["write"] = 1  # openpyxl worksheets are not thread-safe
+        pipeline = Pipeline([
+            Stage("generate", self._generate_stage, counts["generate"], queue_size),
+            Stage("send", self._send_stage, counts["send"], queue_size),
+            Stage("write", self._write_stage, counts["write"], queue_size),
+        ], report_interval=30, stop_event=self.stop_event, drain_timeout=self.stop_timeout)
+
+        with metrics.timer("excel.process"):
+            if only_rows is None and plan and not self.streaming:
+                with metrics.timer("excel.plan"):
+                    only_rows = self.plan_due_rows()
+
+            self.sent_rows = {}
+            self._pool_size = counts["send"]
+            try:
+                self.pipeline_report = pipeline.run(self._prefix_ordered(self._iter_due_rows(only_rows)))
+            finally:
+                with self._pool_lock:
+                    if self._pool_open:
+                        self.sender.close_pool()
+                        self._pool_open = False
+        if self.stopped:
+            log.info(f"ColdFlow stopped on request after sending {len(self.sent_rows)} emails.")
+        if self._generator is not None and self._generator.cache is not None:
+            log.info(f"Generation cache: {self._generator.cache.stats()}")
+        return self.pipeline_report
+
+    def _send_concurrency(self, workers):
+        """
+        Send workers for a run: at least the total concurrency of a multi-account sender, so
+        every account's connections can be busy at once. Building that sender needs only its
+        accounts file, so no sender is created here just to ask.
+        """
+        sender = self._sender
+        if sender is None and os.getenv('COLDFLOW_SENDER_ACCOUNTS'):
+            sender = self.sender
+        return max(workers, getattr(sender, "total_concurrency", workers))
+
+    def _open_sender_pool(self):
+        """Before the run's first send, open pooled SMTP sessions to reuse for the rest of it."""
+        with self._pool_lock:
+            if not self._pool_open:
+                self.sender.open_pool(size=self._pool_size)
+                self._pool_open = True
+
+    def stop(self):
+        """
+        Ask a running process_excel_sheet to wind down; safe to call from any thread. Sends
+        already made are still written; workers stuck in a Groq or SMTP call past
+        stop_timeout are abandoned, and their sends are replayed from the journal next time.
+        """
+        self.stop_event.set()
+
+    @property
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def _iter_due_rows(self, only_rows=None):
+        """
+        Parse the data rows and yield the ones whose email is due, in sheet order.
+        `only_rows` restricts the pass to those Excel rows (random access in full edit
+        mode, a filtered scan in streaming mode).
+        """
+        now = datetime.now()
+        today = now.date()
+        for row_index_excel, row in self._iter_sheet_rows(only_rows):
+            parsed = self._parse_row(row_index_excel, row)
+            if parsed is None:
+                continue
+            next_due = parsed["next_due"]
+            if next_due is None:
+                continue
+            retry_at = self.deferred_rows.get(row_index_excel)
+            if retry_at is not None and retry_at > now:
+                log.debug(f"Row {row_index_excel} is deferred until {retry_at}. Skipping email for this row.")
+                continue
+            if next_due <= today:
+                log.debug(f"Row {row_index_excel} is due (next due {next_due}). Proceeding to send email.")
+                yield parsed
+            else:
+                log.debug(f"Row {row_index_excel} is not due until {next_due}. Skipping email for this row.")
+
+    def _prefix_ordered(self, due_rows):
+        """
+        Reorder due rows in windows of prefix_window: rows that already have content first,
+        then the rest by model and prompt, so identical and shared-prefix prompts are
+        requested back to back (provider prefix caching, deduplication).
+        """
+        if not self.prefix_window or self.prefix_window < 2:
+            yield from due_rows
+            return
+        window = []
+        for due in due_rows:
+            window.append(due)
+            if len(window) >= self.prefix_window:
+                yield from sorted(window, key=self._prefix_key)
+                window = []
+        yield from sorted(window, key=self._prefix_key)
+
+    @staticmethod
+    def _prefix_key(due):
+        if due["email_content"]:
+            return (0, "", "")
+        return (1, due["model"] or "", str(due["prompt"] or ""))
+
+    def _row_variables(self, row):
+        """Template placeholders for a sheet row: one per named column, plus short aliases."""
+        if self._variable_names is None:
+            with self._sheet_lock:
+                header = next(self.sheet.iter_rows(min_row=2, max_row=2, values_only=True), ())
+            self._variable_names = [variable_name(cell) if cell else None for cell in header]
+        variables = {name: value for name, value in zip(self._variable_names, row) if name}
+        cells = list(row[1:]) + [None] * 8
+        variables.update(company=cells[0], recipient=cells[1], email=cells[2], prompt=cells[7])
+        return variables
+
+    def plan_due_rows(self, today=None):
+        """
+        Columnar planning pass: the Excel rows due now, decided over whole columns at once.
+        Returns None when the sheet is too narrow to plan, so the row-by-row pass
+        (and its warnings) runs instead.
+        """
+        if self.sheet.max_column is None or self.sheet.max_column < 11:
+            return None
+        from planner import plan_due_rows  # type: ignore  # pandas is only needed once a run starts
+        rows = plan_due_rows(self.sheet, today=today)
+        log.info(f"Planning pass selected {len(rows)} due rows.")
+        return set(rows) - self.journaled_rows
+
+    def row_schedule(self, only_rows=None):
+        """Yield (excel_row, next_due) for every processable row; next_due as in next_due_date."""
+        for row_index_excel, row in self._iter_sheet_rows(only_rows):
+            parsed = self._parse_row(row_index_excel, row)
+            if parsed is not None:
+                yield row_index_excel, parsed["next_due"]
+
+    def _iter_sheet_rows(self, only_rows=None):
+        """Yield (excel_row, values) for the data rows, skipping the header and journaled rows."""
+        if only_rows is not None and not self.streaming:
+            for row_index_excel in sorted(only_rows):
+                if row_index_excel < 2 or row_index_excel in self.journaled_rows:
+                    continue
+                with self._sheet_lock:
+                    row = next(self.sheet.iter_rows(min_row=row_index_excel, max_row=row_index_excel, values_only=True))
+                yield row_index_excel, row
+            return
 
         header_skipped = False
         row_index_excel = 1  # Start with the first row in Excel
 
-        for row in self.sheet.iter_rows(values_only=True):
+        rows = self.sheet.iter_rows(values_only=True)
+        while True:
+            with self._sheet_lock:
+                row = next(rows, None)
+            if row is None:
+                break
             if not header_skipped:
                 log.debug("Skipping header row.")
                 header_skipped = True
-                row_index_excel += 1
-                continue
+            elif row_index_excel in self.journaled_rows:
+                log.info(f"Skipping row {row_index_excel}: already sent according to the journal.")
+            elif only_rows is None or row_index_excel in only_rows:
+                yield row_index_excel, row
+            row_index_excel += 1
 
-            row_data = list(row[1:])  # Skip the first column
-            if len(row_data) < 10:
-                log.warning(f"Skipping row {row_index_excel} due to insufficient data: {row_data}")
-                row_index_excel += 1
-                continue
+    def _parse_row(self, row_index_excel, row):
+        """
+        Parse one data row into the fields the pipeline needs plus its next due date
+        (see next_due_date). Returns None for rows that cannot be processed.
+        """
+        row_data = list(row[1:])  # Skip the first column
+        if self.streaming and row_data and len(row_data) < 11:
+            # Unsized read-only sheets (e.g. after a streaming write-back) trim trailing empty cells
+            row_data.extend([None] * (11 - len(row_data)))
+        if len(row_data) < 10:
+            log.warning(f"Skipping row {row_index_excel} due to insufficient data: {row_data}")
+            return None
+
+        company_name = row_data[0]
+        email_recipient = row_data[1]
+        email_id = row_data[2]
+        send_count_str = row_data[3]
+        frequency_str = row_data[4]
+        last_email_date_raw = row_data[6]
+        prompt = row_data[7]
+        system = None
+        if self.prompt_template is not None:
+            prompt = self.prompt_template.render(self._row_variables(row))
+            system = self.prompt_template.preamble or None
+        subject = row_data[8]
+        email_content = row_data[9]
+        status = row_data[10] if len(row_data) > 10 else None
+        model = row_data[11] if len(row_data) > 11 else None  # Optional Model column (M)
+
+        log.info(f"Processing row: {email_recipient} at {company_name} (Excel Row: {row_index_excel})")
+        try:
+            # Check if the values are not None before attempting conversion
+            if send_count_str is not None and frequency_str is not None:
+                send_count = int(send_count_str)
+                frequency = int(frequency_str)
+            else:
+                log.error(f"Send_Count or Frequency is None for {email_recipient}. Skipping row.")
+                return None
+        except ValueError:
+            log.error(f"Could not convert Send_Count '{send_count_str}' or Frequency '{frequency_str}' to integer for {email_recipient}. Skipping row.")
+            return None
+
+        if last_email_date_raw is not None and send_count > 1 and parse_last_email_date(last_email_date_raw) is None:
+            log.warning(f"Invalid Last_Email_Date format: {last_email_date_raw}. Proceeding to send email.")
+
+        next_due = next_due_date(send_count, frequency, last_email_date_raw)
+        if isinstance(status, str) and status.startswith(FAILED_STATUS):
+            log.debug(f"Row {row_index_excel} failed permanently ({status}). Clear its Status to retry it.")
+            next_due = None
+
+        return {
+            "row": row_index_excel,
+            "company_name": company_name,
+            "email_recipient": email_recipient,
+            "email_id": email_id,
+            "send_count": send_count,
+            "frequency": frequency,
+            "next_due": next_due,
+            "prompt": prompt,
+            "system": system,
+            "subject": subject,
+            "email_content": email_content,
+            "model": str(model).strip() if model else None,
+            "generated": False,
+        }
 
-            company_name = row_data[0]
-            email_recipient = row_data[1]
-            email_id = row_data[2]
-            send_count_str = row_data[3]
-            frequency_str = row_data[4]
-            last_email_date_raw = row_data[6]
-            prompt = row_data[7]
-            subject = row_data[8]
-            email_content = row_data[9]
-            status = row_data[10]
-
-            log.info(f"Processing row: {email_recipient} at {company_name} (Excel Row: {row_index_excel})")
+    def _generate_stage(self, due):
+        """Generate content for a due row that has none yet (rate-limited Groq call, using the row's Model if set)."""
+        if self.stopped:
+            return None
+        if is_ref(due["email_content"]) and due["email_content"] not in self.body_store:
+            log.warning(f"Row {due['row']}: body {due['email_content']} is missing from the body store; generating a new one.")
+            due["email_content"] = None
+        if not due["email_content"]:
             try:
-                # Check if the values are not None before attempting conversion
-                if send_count_str is not None and frequency_str is not None:
-                    send_count = int(send_count_str)
-                    frequency = int(frequency_str)
-                else:
-                    log.error(f"Send_Count or Frequency is None for {email_recipient}. Skipping row.")
-                    row_index_excel += 1
-                    continue
-            except ValueError:
-                log.error(f"Could not convert Send_Count '{send_count_str}' or Frequency '{frequency_str}' to integer for {email_recipient}. Skipping row.")
-                row_index_excel += 1
+                due["email_content"] = self._generate_once(due)
+            except Exception as e:
+                if self.stopped:  # Cancelled (or cut off) by a stop request; the row stays due
+                    return None
+                log.error(f"Content generation failed for row {due['row']} ({due['email_recipient']}): {e}")
+                return self._handle_failure(due, "generate", e)
+            due["generated"] = True
+        return due
+
+    def _generate_once(self, due, keep=1024):
+        """
+        Generate the row's content, sharing one generation between rows whose system
+        message, prompt and model are identical. The last `keep` results are remembered.
+        """
+        key = (due["system"], due["prompt"], due["model"])
+        with self._generation_lock:
+            future = self._generations.get(key)
+            owner = future is None
+            if owner:
+                future = self._generations[key] = Future()
+            else:
+                self._generations.move_to_end(key)
+        if not owner:
+            metrics.increment("llm.deduplicated")
+            return future.result()
+        try:
+            content = self.generator.generate_cover_letter_first_time(
+                due["prompt"], stop_event=self.stop_event, model=due["model"], system=due["system"])
+        except BaseException as e:
+            with self._generation_lock:
+                self._generations.pop(key, None)  # A later attempt generates afresh
+            future.set_exception(e)
+            raise
+        future.set_result(content)
+        with self._generation_lock:
+            while len(self._generations) > keep:
+                oldest = next(iter(self._generations))
+                if not self._generations[oldest].done():
+                    break
+                self._generations.popitem(last=False)
+        return content
+
+    def _handle_failure(self, due, stage, error):
+        """
+        Defer the row on the retry queue if the failure is transient and it has retries left,
+        otherwise mark it failed for good. The resulting Status update goes through the write stage.
+        """
+        row_index_excel = due["row"]
+        reason = f"{stage}: {error}"
+        if classify_failure(error) != PERMANENT:
+            retry_at = self.retry_queue.defer(*self._journal_key(), row_index_excel, stage, error,
+                                              min_delay=retry_after_hint(error))
+            if retry_at is not None:
+                self.deferred_rows[row_index_excel] = retry_at
+                log.warning(f"Row {row_index_excel} ({due['email_recipient']}) deferred until {retry_at:%Y-%m-%d %H:%M:%S} after a transient {reason}")
+                metrics.increment("rows.deferred")
+                due["outcome"] = "deferred"
+                due["changes"] = {12: f"{RETRY_STATUS}: {retry_at:%Y-%m-%d %H:%M}"}
+                return due
+            reason = f"gave up after {self.retry_queue.max_attempts} attempts, last {reason}"
+        self.deferred_rows.pop(row_index_excel, None)
+        self.retry_queue.clear(*self._journal_key(), row_index_excel)
+        log.error(f"Row {row_index_excel} ({due['email_recipient']}) failed permanently: {reason}")
+        metrics.increment("rows.failed")
+        due["outcome"] = "failed"
+        due["changes"] = {12: f"{FAILED_STATUS}: {reason}"[:250]}
+        return due
+
+    def _send_stage(self, due):
+        """Send the row's email over the pooled SMTP connections and journal the send."""
+        if "outcome" in due:  # Generation already failed; only the Status update is left
+            return due
+        if self.stopped:
+            log.debug(f"Stop requested; row {due['row']} is left for the next run.")
+            return None
+        if self.send_limiter is not None:
+            try:
+                self.send_limiter.acquire(stop_event=self.stop_event)
+            except Cancelled:
+                return None
+        try:
+            self._open_sender_pool()
+            body = self.body_store.resolve(due["email_content"])  # Stored bodies are only read here
+            self.sender.send_email(due["email_id"], due["subject"], body, attachment_path, raise_errors=True)
+        except Exception as e:
+            return self._handle_failure(due, "send", e)
+        if due["generated"]:
+            log.debug(f"Generated and sent email to {due['email_recipient']} at {due['company_name']}")
+        else:
+            log.debug(f"Successfully sent email to {due['email_recipient']} at {due['company_name']}")
+
+        changes = {
+            5: due["send_count"] - 1,  # Send_Count
+            8: datetime.now().strftime('%Y-%m-%d'),  # Last_Email_Date
+            12: SENT_STATUS,  # Status
+        }
+        if due["generated"]:
+            content = due["email_content"]
+            changes[11] = content if self.inline_bodies else self.body_store.put(content)  # Email Content
+        due["outcome"] = "sent"
+        due["changes"] = changes
+        due["journal_id"] = self.journal.record(*self._journal_key(), due["row"], due["email_id"], changes)
+        if self.deferred_rows.pop(due["row"], None) is not None:
+            self.retry_queue.clear(*self._journal_key(), due["row"])
+        return due
+
+    def _write_stage(self, due):
+        """Write the row's updates back to the sheet, merging a checkpoint every checkpoint_interval seconds."""
+        row_index_excel = due["row"]
+        # Held so a save after an abandoned (stopped) run never sees a half-applied row
+        with self._sheet_lock:
+            for column, value in due["changes"].items():
+                self.update_cell(row_index_excel, column, value)
+            if due["outcome"] != "sent":
+                return due
+            self._applied_journal_ids.append(due["journal_id"])
+            self.sent_rows[row_index_excel] = next_due_date(due["send_count"] - 1, due["frequency"], datetime.now())
+            log.debug(f"Updated Send_Count, Last_Email_Date and Status ('Email Sent') for row {row_index_excel}")
+
+            # A streaming run cannot rewrite the file it is still reading; it merges on save
+            if (not self.streaming and self.checkpoint_interval is not None
+                    and time.monotonic() - self._last_checkpoint >= self.checkpoint_interval):
+                self.save_workbook()
+        return due
+
+    def simulate(self, days=30, start=None, report_path=None, **limits):
+        """
+        Dry run: project the campaign over `days` simulated days from `start` (default today)
+        with the same eligibility rule as process_excel_sheet, without calling Groq or SMTP.
+        `limits` are the rate, quota and concurrency settings of simulator.simulate_campaign.
+        Rows with a failed Status are left out and deferred rows wait for their retry time;
+        sends already journaled count as made. Returns (schedule, summary) and writes the
+        per-day schedule as CSV to `report_path` if given. Build the ColdFlow with
+        dry_run=True to leave the workbook and the run metrics untouched.
+        """
+        from simulator import simulate_campaign, write_schedule  # type: ignore  # numpy/pandas, as for planning
+        start = start or datetime.now().date()
+        columns = {5: [], 6: [], 8: [], 9: [], 11: [], 12: []}  # Send_Count, Frequency, Last_Email_Date, Prompt, Content, Status
+        with self._sheet_lock:
+            rows = self.sheet.iter_rows(min_row=2, min_col=5, max_col=12, values_only=True)
+            for row_index_excel, row in enumerate(rows, start=2):
+                row = list(row) + [None] * (8 - len(row))
+                for column, value in self.changes.get(row_index_excel, {}).items():
+                    if 5 <= column <= 12:
+                        row[column - 5] = value
+                for column, values in columns.items():
+                    values.append(row[column - 5])
+        preamble_tokens = len(self.prompt_template.preamble) // 4 if self.prompt_template is not None else 0
+        prompt_tokens = [len(str(prompt or "")) // 4 + preamble_tokens for prompt in columns[9]]
+        needs_content = [not content for content in columns[11]]
+        not_before = []
+        for row_index_excel, status in enumerate(columns[12], start=2):
+            retry_at = self.deferred_rows.get(row_index_excel)
+            if isinstance(status, str) and status.startswith(FAILED_STATUS):
+                not_before.append(float("inf"))
+            elif retry_at is not None:
+                not_before.append(max((retry_at.date() - start).days, 0))
+            else:
+                not_before.append(0)
+        schedule, summary = simulate_campaign(columns[5], columns[6], columns[8], needs_content, prompt_tokens,
+                                              start, days=days, not_before=not_before, **limits)
+        if report_path:
+            write_schedule(schedule, report_path)
+            log.info(f"Simulated schedule written to: {report_path}")
+        log.info(f"Simulation: {summary}")
+        return schedule, summary
+
+    def export_bodies(self):
+        """
+        Put the full text of every stored body back into its Email Content cell, e.g. to
+        read or edit the emails in Excel. Returns the number of rows changed; call
+        save_workbook to write them.
+        """
+        exported = 0
+        for row_index_excel, row in self._iter_sheet_rows():
+            content = row[10] if len(row) > 10 else None
+            if not is_ref(content):
                 continue
+            try:
+                self.update_cell(row_index_excel, 11, self.body_store.get(content))
+            except KeyError as e:
+                log.warning(f"Row {row_index_excel}: {e}")
+                continue
+            exported += 1
+        log.info(f"Exported {exported} stored bodies into the sheet.")
+        return exported
 
-            if send_count > 1:
-                log.debug(f"Send_Count ({send_count}) is greater than 1. Proceeding with email check.")
+    def compact_bodies(self):
+        """
+        Move Email Content text written into the sheet (by hand, by export_bodies or by older
+        versions) into the body store, leaving references. Returns the number of rows
+        changed; call save_workbook to write them.
+        """
+        compacted = 0
+        for row_index_excel, row in self._iter_sheet_rows():
+            content = row[10] if len(row) > 10 else None
+            if row_index_excel <= 2:  # Row 2 holds the column headers
+                continue
+            if isinstance(content, str) and content.strip() and not is_ref(content):
+                self.update_cell(row_index_excel, 11, self.body_store.put(content))
+                compacted += 1
+        log.info(f"Moved {compacted} email bodies from the sheet into the body store.")
+        return compacted
 
-                send_email_flag = False
+    def update_cell(self, row, column, value):
+        """Record a cell update in the change log; save_workbook applies it."""
+        self.changes.setdefault(row, {})[column] = value
 
-                if last_email_date_raw is None:
-                    log.debug("Last_Email_Date is None. Proceeding to send email.")
-                    send_email_flag = True
-                else:
-                    today = datetime.now().date()
-                    last_email_date = None
-                    if isinstance(last_email_date_raw, datetime):
-                        last_email_date = last_email_date_raw.date()
-                    else:
-                        try:
-                            last_email_date = datetime.strptime(str(last_email_date_raw).split()[0], '%Y-%m-%d').date()
-                        except (ValueError, AttributeError):
-                            log.warning(f"Invalid Last_Email_Date format: {last_email_date_raw}. Proceeding to send email.")
-                            send_email_flag = True  # Treat as no last email date
-
-                    if last_email_date:
-                        time_difference = today - last_email_date
-                        if time_difference >= timedelta(days=frequency):
-                            log.debug(f"Time difference ({time_difference}) matches/exceeds frequency ({frequency}). Proceeding to send email.")
-                            send_email_flag = True
-                        else:
-                            log.debug(f"Time difference ({time_difference}) does not match frequency ({frequency}). Skipping email for this row.")
-
-                if send_email_flag:
-                    if email_content:
-                        es.send_email(email_id, subject, email_content, attachment_path)
-                        log.debug(f"Successfully sent email to {email_recipient} at {company_name}")
-                        self.sheet.cell(row=row_index_excel + 1, column=9, value=email_content) # Update Email Content
-                    else:
-                        email_content = generator.generate_cover_letter_first_time(prompt)
-                        es.send_email(email_id, subject, email_content, attachment_path)
-                        log.debug(f"Generated and sent email to {email_recipient} at {company_name}")
-                        self.sheet.cell(row=row_index_excel, column=11, value=email_content) # Update Email Content
-
-                    self.sheet.cell(row=row_index_excel, column=5, value=send_count - 1)
-                    log.debug(f"Updated Send_Count to {send_count - 1} for row {row_index_excel}")
-                    self.sheet.cell(row=row_index_excel, column=8, value=datetime.now().strftime('%Y-%m-%d'))
-                    log.debug(f"Updated Last_Email_Date to {datetime.now().strftime('%Y-%m-%d')} for row {row_index_excel}")
-                    self.sheet.cell(row=row_index_excel, column=12, value=f"Email Sent.")
-                    log.debug(f"Updated Status to 'Email Sent' for row {row_index_excel}")
+    def _apply_changes(self):
+        """Apply the change log to the in-memory sheet (full edit mode)."""
+        for row, columns in self.changes.items():
+            for column, value in columns.items():
+                self.sheet.cell(row=row, column=column).value = value
 
-            row_index_excel += 1
+    def _write_back_streaming(self):
+        """
+        Stream every sheet from the read-only source into a write-only copy, applying the
+        change log to ColdFlow's sheet on the way, then swap the copy into place.
+        Only values are carried over; cell styling is not preserved in streaming mode.
+        """
+        sheet_title = self.sheet.title
+        self.workbook.close()
+        source = openpyxl.load_workbook(self.excel_file_path, read_only=True)
+        target = openpyxl.Workbook(write_only=True)
+        temp_path = f"{self.excel_file_path}.tmp"
+        try:
+            active_title = source.active.title
+            for index, worksheet in enumerate(source.worksheets):
+                out = target.create_sheet(worksheet.title)
+                changes = self.changes if worksheet.title == sheet_title else {}
+                for row_index, row in enumerate(worksheet.iter_rows(values_only=True), start=1):
+                    row_changes = changes.get(row_index)
+                    if row_changes:
+                        row = list(row)
+                        width = max(row_changes)
+                        if len(row) < width:
+                            row.extend([None] * (width - len(row)))
+                        for column, value in row_changes.items():
+                            row[column - 1] = value
+                    out.append(row)
+                if worksheet.title == active_title:
+                    target.active = index
+            target.save(temp_path)
+        finally:
+            source.close()
+        os.replace(temp_path, self.excel_file_path)
+        self.workbook = openpyxl.load_workbook(self.excel_file_path, read_only=True)
+        self.sheet = self.workbook[sheet_title]
 
     def save_workbook(self):
+        if self.dry_run:
+            log.info(f"Dry run: {self.excel_file_path} is not saved.")
+            return False
+        with self._sheet_lock:
+            return self._save_workbook()
+
+    def _save_workbook(self):
         if self.workbook:
             try:
-                self.workbook.save(self.excel_file_path)
-                log.info(f"Successfully saved changes to: {self.excel_file_path}")
+                with metrics.timer("excel.save"):
+                    if self.streaming:
+                        self._write_back_streaming()
+                    else:
+                        self._apply_changes()
+                        self.workbook.save(self.excel_file_path)
+                log.info(f"Successfully saved {len(self.changes)} changed rows to: {self.excel_file_path}")
+                self.changes.clear()
+                if self._applied_journal_ids:
+                    self.journal.checkpoint(*self._journal_key(), self._applied_journal_ids)
+                    self._applied_journal_ids = []
+                self._last_checkpoint = time.monotonic()
                 return True
             except Exception as e:
                 log.error(f"Error saving workbook: {e}", exc_info=True)
@@ -146,8 +750,46 @@ class ColdFlow:
             log.error("Workbook not loaded. Cannot save.")
             return False
 
+    def write_run_report(self, report_path=None, prometheus_path=None):
+        """
+        Write the run's metrics (per-stage counts, errors and p50/p95/p99 latencies, LLM
+        tokens, SMTP bytes) with the pipeline and cache stats to a JSON report, by default
+        reports/run-<timestamp>.json, and optionally to a Prometheus text-format file.
+        Returns the JSON report path.
+        """
+        report_path = report_path or os.path.join('reports', f"run-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+        extra = {
+            "workbook": self.excel_file_path,
+            "rows_sent": len(self.sent_rows),
+            "pipeline": self.pipeline_report,
+        }
+        if self._generator is not None and self._generator.cache is not None:
+            extra["generation_cache"] = self._generator.cache.stats()
+        if self.body_store is not None:
+            extra["body_store"] = self.body_store.stats()
+        metrics.write_json(report_path, extra)
+        if prometheus_path:
+            metrics.write_prometheus(prometheus_path)
+        log.info(f"Run report written to: {report_path}")
+        return report_path
+
 if __name__ == "__main__":
-    excel_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'data', 'cold_email_data.xlsx')
-    coldflow = ColdFlow(excel_file_path)
-    coldflow.process_excel_sheet()
-    coldflow.save_workbook()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Run ColdFlow over a workbook, or move its email bodies in or out of the body store.")
+    parser.add_argument("workbook", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'data', 'cold_email_data.xlsx'))
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--export-bodies", action="store_true", help="write the full text of stored bodies back into the sheet")
+    action.add_argument("--compact-bodies", action="store_true", help="move body text in the sheet into the body store")
+    args = parser.parse_args()
+    coldflow = ColdFlow(args.workbook)
+    if args.export_bodies:
+        coldflow.export_bodies()
+        coldflow.save_workbook()
+    elif args.compact_bodies:
+        coldflow.compact_bodies()
+        coldflow.save_workbook()
+    else:
+        coldflow.process_excel_sheet()
+        coldflow.save_workbook()
+        coldflow.write_run_report()
\ No newline at end of file
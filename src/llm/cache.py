@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class GenerationCache:
+    """
+    Persistent, content-addressed cache of generated email bodies, stored in SQLite.
+
+    Entries are keyed by a hash of the prompt, model name and generation parameters and are
+    committed as soon as they are generated, so a crashed or repeated run does not pay for
+    the same completion twice. Entries older than `max_age_seconds` expire, and once the
+    cache holds more than `max_entries` the least recently used ones are evicted.
+    """
+    def __init__(self, path=os.path.join('data', 'generation_cache.sqlite3'),
+                 max_entries=10000, max_age_seconds=90 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            " key TEXT PRIMARY KEY, content TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS generations_last_used ON generations (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(prompt, model, params=None):
+        payload = json.dumps({"prompt": prompt, "model": model, "params": params or {}}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached body for `key`, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT content, created FROM generations WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age_seconds and now - row[1] > self.max_age_seconds:
+                self._conn.execute("DELETE FROM generations WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE generations SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, content):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (key, content, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, content, now, now),
+            )
+            self._conn.commit()
+            self._evict(now)
+
+    def _evict(self, now):
+        """Drop expired entries, then the least recently used ones above max_entries."""
+        removed = 0
+        if self.max_age_seconds:
+            removed += self._conn.execute(
+                "DELETE FROM generations WHERE created < ?", (now - self.max_age_seconds,)
+            ).rowcount
+        if self.max_entries:
+            removed += self._conn.execute(
+                "DELETE FROM generations WHERE key IN ("
+                " SELECT key FROM generations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        self._conn.commit()  # always end the implicit transaction, or other connections stay locked out
+        self.evictions += removed
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,9 +1,75 @@
 import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from groq import Groq
 from dotenv import load_dotenv
+from rate_limiter import Cancelled, RateLimiter
+from cache import GenerationCache
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../metrics')))
+from metrics import metrics
+
+# A closing line ("Sincerely," / "Best regards") on its own; the signature block follows it.
+# Closings that also work as a sentence ("Thank you." / "Thanks!") only count with a comma.
+SIGN_OFF = re.compile(
+    r"^((sincerely|yours sincerely|yours truly|best regards|kind regards|warm regards|warmest regards|"
+    r"regards|respectfully)[,.!]?|(best|best wishes|thank you|thanks|many thanks|cheers),)$",
+    re.IGNORECASE,
+)
+# Signature lines (name, title, phone, email) are short and few; anything longer is letter text
+SIGNATURE_LINE_LENGTH = 80
+SIGNATURE_LINES = 6
+REFUSAL = re.compile(r"^\W*(i'm sorry|i am sorry|i cannot|i can't|i can not|as an ai)\b", re.IGNORECASE)
+
+
+class GenerationRejected(Exception):
+    """
+    The model's output is not a usable email body: a refusal (permanent, the prompt needs
+    changing) or a body cut off before the sign-off (worth another try).
+    """
+    def __init__(self, message, permanent=False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+def complete_body_end(text):
+    """
+    Index just past the signature block if `text` holds a signed email followed by a blank
+    line (a sign-off line, the short signature lines under it, then a blank line), otherwise
+    None. Only what the model adds after that blank line (notes, alternatives) falls beyond
+    the index; a later sign-off, e.g. after a "Thanks," mid-letter, starts over.
+    """
+    lines = text.split("\n")[:-1]  # The last line may still be streaming
+    offset = 0
+    end = None
+    signed = False
+    signature_lines = 0
+    signature_end = None
+    for line in lines:
+        offset += len(line) + 1
+        stripped = line.strip()
+        if SIGN_OFF.match(stripped):
+            signed, signature_lines, end = True, 0, None
+        elif not signed:
+            continue
+        elif stripped:
+            signature_lines += 1
+            signature_end = offset - 1
+            if len(stripped) > SIGNATURE_LINE_LENGTH or signature_lines > SIGNATURE_LINES:
+                signed = False
+        elif signature_lines:
+            end = signature_end
+            signed = False
+    return end
+
 
 class CoverLetterGenerator:
-    def __init__(self, env_path='src/credentials/groq.env'):
+    def __init__(self, env_path='src/credentials/groq.env', max_workers=4,
+                 requests_per_minute=30, tokens_per_minute=6000, rate_limiter=None,
+                 expected_completion_tokens=400, cache=None, bypass_cache=False, request_timeout=60.0,
+                 stream=True, max_tokens=700, temperature=0.7, stop=None):
         load_dotenv(dotenv_path=env_path)
         
         api_key = os.getenv('COLDFLOW_GROQ_API_KEY')
@@ -12,15 +78,180 @@ class CoverLetterGenerator:
             raise ValueError("API key not found.")
         
         self.client = Groq(api_key=api_key)
-        
-    def generate_cover_letter_first_time(self, prompt):
+        self.model = "llama-3.3-70b-versatile"
+        self.max_workers = max_workers
+        self.expected_completion_tokens = expected_completion_tokens
+        # Pass one RateLimiter to several generators to make them share the provider quota
+        self.rate_limiter = rate_limiter or RateLimiter(requests_per_minute, tokens_per_minute)
+        # Optional GenerationCache; bypass_cache forces fresh completions but still stores them
+        self.cache = cache
+        self.bypass_cache = bypass_cache
+        # Upper bound on one API call, so a stop request never waits on a hung connection for long
+        self.request_timeout = request_timeout
+        # Stream the completion and stop reading once the signature block is followed by a blank line
+        self.stream = stream
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stop = list(stop) if stop else None
+
+    def generation_params(self):
+        """Parameters that change the completion and therefore belong in the cache key."""
+        return {"max_tokens": self.max_tokens, "temperature": self.temperature, "stop": self.stop}
+
+    def estimate_tokens(self, prompt):
+        """Rough token cost of a request (~4 characters per token plus the expected completion)."""
+        expected = self.expected_completion_tokens
+        if self.max_tokens:
+            expected = min(expected, self.max_tokens)
+        return len(prompt) // 4 + expected
+
+    def _request_kwargs(self, model):
+        kwargs = {"model": model, "timeout": self.request_timeout}
+        if self.max_tokens:
+            kwargs["max_tokens"] = self.max_tokens
+        if self.temperature is not None:
+            kwargs["temperature"] = self.temperature
+        if self.stop:
+            kwargs["stop"] = self.stop
+        return kwargs
+
+    def generate_cover_letter_first_time(self, prompt, bypass_cache=None, stop_event=None, model=None, system=None):
+        """
+        Generate the email body for `prompt` with `model` (default self.model). `system`, the
+        shared preamble of a PromptTemplate, goes first as the system message so requests
+        share a prefix the provider can reuse. Streaming
+        requests stop reading once the signature block is complete and give up after
+        request_timeout seconds; refusals and bodies cut off by max_tokens raise
+        GenerationRejected.
+        """
         prompt_first_time = f"{prompt}"
+        model = model or self.model
+        cache_key = None
+        if self.cache is not None:
+            params = self.generation_params()
+            if system:
+                params["system"] = system
+            cache_key = GenerationCache.make_key(prompt_first_time, model, params)
+            if not (self.bypass_cache if bypass_cache is None else bypass_cache):
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    metrics.increment("llm.cache_hits")
+                    return cached
+
+        estimated_tokens = self.estimate_tokens((system or "") + prompt_first_time)
+        self.rate_limiter.acquire(estimated_tokens, stop_event=stop_event)
         
-        response = self.client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt_first_time}],
-            model="llama-3.3-70b-versatile"
-        )
-        cover_letter_first_time = response.choices[0].message.content.strip()
+        messages = [{"role": "user", "content": prompt_first_time}]
+        if system:
+            messages.insert(0, {"role": "system", "content": system})
+        with metrics.timer("llm.generate"):
+            if self.stream:
+                text, finish_reason, usage = self._stream_completion(messages, model, stop_event)
+            else:
+                response = self.client.chat.completions.create(messages=messages, **self._request_kwargs(model))
+                usage = getattr(response, "usage", None)
+                text = response.choices[0].message.content or ""
+                finish_reason = getattr(response.choices[0], "finish_reason", None)
+        if usage is None:  # A stream read only up to the sign-off reports no usage
+            prompt_tokens = ((len(system) if system else 0) + len(prompt_first_time)) // 4
+            completion_tokens = len(text) // 4
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+        else:
+            usage = {field: getattr(usage, field, None) or 0
+                     for field in ("prompt_tokens", "completion_tokens", "total_tokens")}
+        self.rate_limiter.settle(estimated_tokens, usage["total_tokens"])
+        for field, value in usage.items():
+            metrics.increment(f"llm.{field}", value)
+        cover_letter_first_time = self._validate(text, finish_reason)
+        if cache_key is not None:
+            self.cache.put(cache_key, cover_letter_first_time)
         return cover_letter_first_time
+
+    def _stream_completion(self, messages, model, stop_event=None):
+        """
+        Read a streamed completion until the body is complete, the stream ends, the request
+        deadline passes (TimeoutError) or `stop_event` is set (Cancelled).
+        Returns (text, finish_reason, usage or None).
+        """
+        deadline = time.monotonic() + self.request_timeout if self.request_timeout else None
+        stream = self.client.chat.completions.create(messages=messages, stream=True, **self._request_kwargs(model))
+        parts = []
+        finish_reason = None
+        usage = None
+        try:
+            for chunk in stream:
+                if stop_event is not None and stop_event.is_set():
+                    raise Cancelled("Generation cancelled.")
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"Generation took longer than {self.request_timeout}s.")
+                x_groq = getattr(chunk, "x_groq", None)
+                usage = getattr(x_groq, "usage", None) or getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                finish_reason = choice.finish_reason or finish_reason
+                delta = choice.delta.content
+                if not delta:
+                    continue
+                parts.append(delta)
+                if "\n" in delta:
+                    text = "".join(parts)
+                    if REFUSAL.match(text):
+                        raise GenerationRejected(f"Model refused: {text.strip()[:80]!r}", permanent=True)
+                    end = complete_body_end(text)
+                    if end is not None:
+                        metrics.increment("llm.early_cutoffs")
+                        return text[:end], "stop", None
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        return "".join(parts), finish_reason, usage
+
+    @staticmethod
+    def _validate(text, finish_reason):
+        """
+        The usable email body in `text`, or GenerationRejected. Only a completion cut off by
+        max_tokens is trimmed, to its signature block; without one it is rejected.
+        """
+        end = None
+        if finish_reason == "length":
+            end = complete_body_end(text + "\n")
+        body = (text[:end] if end is not None else text).strip()
+        if not body:
+            raise GenerationRejected("Model returned an empty completion.")
+        if REFUSAL.match(body):
+            raise GenerationRejected(f"Model refused: {body[:80]!r}", permanent=True)
+        if finish_reason == "length" and end is None:
+            raise GenerationRejected("Completion hit max_tokens before the email was signed off.")
+        return body
+
+    def generate_many(self, prompts, max_workers=None, return_exceptions=False):
+        """
+        Generate one cover letter per prompt concurrently, within the shared rate limits.
+        Results are returned in the same order as `prompts`; repeated prompts are generated
+        once. With return_exceptions=True a failed prompt yields its exception instead of
+        aborting the whole batch.
+        """
+        prompts = list(prompts)
+        if not prompts:
+            return []
+        unique = list(dict.fromkeys(prompts))
+        workers = max(1, min(max_workers or self.max_workers, len(unique)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="groq") as pool:
+            by_prompt = {prompt: pool.submit(self.generate_cover_letter_first_time, prompt) for prompt in unique}
+            futures = [by_prompt[prompt] for prompt in prompts]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    if not return_exceptions:
+                        for pending in by_prompt.values():
+                            pending.cancel()
+                        raise
+                    results.append(e)
+        return results
+    
     
-    
\ No newline at end of file
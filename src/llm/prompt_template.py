@@ -0,0 +1,50 @@
+import re
+
+SEPARATOR = "---"
+
+
+def variable_name(header):
+    """Placeholder name for a sheet column header: 'Company_Name' -> 'company_name', 'Role' -> 'role'."""
+    return re.sub(r"\W+", "_", str(header).strip()).strip("_").lower()
+
+
+class _BlankMissing(dict):
+    def __missing__(self, key):
+        return ""
+
+
+class PromptTemplate:
+    """
+    A shared preamble, sent unchanged as the system message of every request so the provider
+    can reuse it as a cached prefix, and a short per-row template filled from the sheet.
+
+    Template files hold the preamble, a line with just "---", then the per-row part:
+
+        You write short, friendly cold emails for internship applications. My name is Nakul,
+        I am 20, my resume is attached. Two paragraphs, no subject line, no preamble.
+        ---
+        Write to {recipient} at {company} about the {role} position. {prompt}
+
+    Placeholders use str.format syntax and are named after the column headers (see
+    variable_name), plus the aliases company, recipient, email and prompt. Empty cells and
+    unknown placeholders render as nothing.
+    """
+    def __init__(self, preamble, template):
+        self.preamble = preamble.strip()
+        self.template = template.strip()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as template_file:
+            text = template_file.read()
+        lines = text.splitlines()
+        for index, line in enumerate(lines):
+            if line.strip() == SEPARATOR:
+                return cls("\n".join(lines[:index]), "\n".join(lines[index + 1:]))
+        return cls("", text)
+
+    def render(self, variables):
+        """The per-row prompt for `variables` ({placeholder: cell value})."""
+        values = _BlankMissing({name: "" if value is None else value for name, value in variables.items()})
+        rendered = self.template.format_map(values)
+        return re.sub(r"[ \t]+", " ", rendered).strip()
@@ -0,0 +1,109 @@
+import threading
+import time
+
+
+class Cancelled(Exception):
+    """Raised by RateLimiter.acquire when its stop_event is set while waiting."""
+
+
+class TokenBucket:
+    """A token bucket that refills continuously at `capacity` units per `period` seconds."""
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.refill_rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available (0 if they are available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # an oversized request waits for a full bucket, not forever
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta):
+        """Charge (positive) or refund (negative) units after the real cost is known."""
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class RateLimiter:
+    """
+    Shared requests-per-minute and tokens-per-minute limiter for LLM calls.
+    Callers reserve an estimated token cost up front and settle the real usage afterwards.
+    A limit of None disables that bucket.
+    """
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+
+    def reserve(self, estimated_tokens=0):
+        """
+        Take one request and `estimated_tokens` tokens if they fit in the budget now and
+        return 0.0, otherwise take nothing and return the seconds to wait before trying again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.requests:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens:
+                wait = max(wait, self.tokens.wait_time(estimated_tokens, now))
+            if wait == 0.0:
+                if self.requests:
+                    self.requests.consume(1)
+                if self.tokens:
+                    self.tokens.consume(estimated_tokens)
+            return wait
+
+    def acquire(self, estimated_tokens=0, stop_event=None):
+        """
+        Block until one request and `estimated_tokens` tokens fit in the budget, then take them.
+        Setting `stop_event` (a threading.Event) ends the wait with Cancelled.
+        """
+        wait_for_budget(self, estimated_tokens, stop_event)
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Correct the token bucket once the provider reports what a request really used."""
+        if self.tokens and actual_tokens is not None:
+            with self._lock:
+                self.tokens.adjust(actual_tokens - estimated_tokens)
+
+
+def wait_for_budget(limiter, estimated_tokens=0, stop_event=None):
+    """Call limiter.reserve until it grants the request, sleeping (or waiting on stop_event) in between."""
+    while True:
+        wait = limiter.reserve(estimated_tokens)
+        if wait == 0.0:
+            return
+        if stop_event is None:
+            time.sleep(wait)
+        elif stop_event.wait(wait):
+            raise Cancelled("Rate limiter wait cancelled.")
+
+
+class SharedRateLimiter:
+    """
+    A RateLimiter living in a multiprocessing manager, used from other processes through
+    `proxy` (see runner.BudgetManager). Only reserve and settle cross the process boundary;
+    waiting happens locally, so a stop_event still cancels it at once.
+    """
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+    def reserve(self, estimated_tokens=0):
+        return self.proxy.reserve(estimated_tokens)
+
+    def acquire(self, estimated_tokens=0, stop_event=None):
+        wait_for_budget(self, estimated_tokens, stop_event)
+
+    def settle(self, estimated_tokens, actual_tokens):
+        self.proxy.settle(estimated_tokens, actual_tokens)
@@ -1,42 +1,126 @@
+import atexit
 import logging
+import logging.handlers
+import multiprocessing.util
 import os
-from datetime import datetime
+import queue
+import threading
 
-class Logger:
-    def __init__(self, log_directory='logs'):
-        self.log_directory = log_directory
-        os.makedirs(self.log_directory, exist_ok=True)
-        self.log_file_1 = os.path.join(self.log_directory, 'log_file_1.log')
-        self.log_file_2 = os.path.join(self.log_directory, 'log_file_2.log')
-        self.log_file_3 = os.path.join(self.log_directory, 'log_file_3.log')
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 
-        self.logger = logging.getLogger('coldflow_logger')
-        self.logger.setLevel(logging.DEBUG)  # Log everything
+_queue = queue.SimpleQueue()
+_listener = None
+_listener_args = None  # setup_logging's arguments, to start the same listener in a worker process
+_setup_lock = threading.Lock()
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread as-is. The queue never leaves the process, so the
+    formatting the stock QueueHandler does up front can wait for the listener thread.
+    """
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(log_directory='logs', mirror_file=None, max_bytes=5 * 1024 * 1024, backup_count=3):
+    """
+    Start the background listener that writes every queued record to one size-rotated file
+    (log_directory/coldflow.log) and, if configured, to a mirror file. The mirror defaults
+    to the COLDFLOW_LOG_MIRROR environment variable. Only the first call has an effect.
+    """
+    global _listener, _listener_args
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+        _listener_args = (log_directory, mirror_file, max_bytes, backup_count)
+        os.makedirs(log_directory, exist_ok=True)
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = []
+        main_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_directory, 'coldflow.log'), maxBytes=max_bytes, backupCount=backup_count,
+            encoding='utf-8',
+        )
+        handlers.append(main_handler)
+        mirror_file = mirror_file or os.getenv('COLDFLOW_LOG_MIRROR')
+        if mirror_file:
+            handlers.append(logging.FileHandler(mirror_file, encoding='utf-8'))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        _listener = logging.handlers.QueueListener(_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
+
+
+def restart_in_child():
+    """
+    Start logging in a worker process, e.g. as a process pool initializer. A forked child
+    inherits the parent's listener state but not its thread, so its records would pile up
+    in a queue nothing reads; this drops the records copied from the parent and starts a
+    listener of the child's own. The listener is flushed when the worker exits, which skips
+    atexit handlers.
+    """
+    global _listener, _setup_lock
+    _setup_lock = threading.Lock()  # May have been held by another parent thread at fork time
+    args = _listener_args or ()
+    if _listener is not None:
+        _listener = None
+        while True:
+            try:
+                _queue.get_nowait()
+            except queue.Empty:
+                break
+    listener = setup_logging(*args)
+    multiprocessing.util.Finalize(None, listener.stop, exitpriority=10)
+    return listener
 
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 
-        # Create and add handlers for each log file
-        handler1 = logging.FileHandler(self.log_file_1)
-        handler1.setFormatter(formatter)
-        self.logger.addHandler(handler1)
+def attach(logger, level=logging.DEBUG):
+    """Route a logger (e.g. the root logger) through the queue; its calls return immediately."""
+    logger.setLevel(level)
+    if not any(isinstance(handler, _InProcessQueueHandler) for handler in logger.handlers):
+        logger.addHandler(_InProcessQueueHandler(_queue))
+    return logger
 
-        handler2 = logging.FileHandler(self.log_file_2)
-        handler2.setFormatter(formatter)
-        self.logger.addHandler(handler2)
 
-        handler3 = logging.FileHandler(self.log_file_3)
-        handler3.setFormatter(formatter)
-        self.logger.addHandler(handler3)
+def add_handler(handler):
+    """Add a handler on the listener side, e.g. a GUI sink; it runs on the listener thread."""
+    listener = setup_logging()
+    if handler.formatter is None:
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    with _setup_lock:
+        listener.handlers = listener.handlers + (handler,)
+
+
+def remove_handler(handler):
+    listener = setup_logging()
+    with _setup_lock:
+        listener.handlers = tuple(h for h in listener.handlers if h is not handler)
+
+
+class Logger:
+    def __init__(self, log_directory='logs', mirror_file=None):
+        self.log_directory = log_directory
+        setup_logging(log_directory, mirror_file)
+
+        self.logger = logging.getLogger('coldflow_logger')
+        self.logger.propagate = False  # records reach the files once, via the queue
+        attach(self.logger)
+
+    def info(self, message, **kwargs):
+        """Logs an info level message."""
+        self.logger.info(message, **kwargs)
 
-    def info(self, message):
-        """Logs an info level message to all three files."""
-        self.logger.info(message)
+    def warning(self, message, **kwargs):
+        """Logs a warning level message."""
+        self.logger.warning(message, **kwargs)
 
-    def error(self, message):
-        """Logs an error level message to all three files."""
-        self.logger.error(message)
+    def error(self, message, **kwargs):
+        """Logs an error level message and echoes it to stdout."""
+        self.logger.error(message, **kwargs)
         print(message)
 
-    def debug(self, message):
-        """Logs a debug level message to all three files."""
-        self.logger.debug(message)
+    def debug(self, message, **kwargs):
+        """Logs a debug level message."""
+        self.logger.debug(message, **kwargs)
@@ -8,11 +8,14 @@ import configparser
 import logging
 import threading
 import time
+import queue
 
 # Adjust path to be relative to the script's location
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.abspath(os.path.join(SCRIPT_DIR, './excel')))
 from write_excel import ColdFlow  # type: ignore
+sys.path.insert(0, os.path.abspath(os.path.join(SCRIPT_DIR, './logger')))
+from logger import add_handler, attach  # type: ignore
 
 CREDENTIALS_DIR = os.path.join(SCRIPT_DIR, 'credentials')
 if not os.path.exists(CREDENTIALS_DIR):
@@ -21,22 +24,41 @@ if not os.path.exists(CREDENTIALS_DIR):
 CONFIG_FILE = os.path.join(CREDENTIALS_DIR, 'coldflow_config.ini')
 KEY_FILE = os.path.join(CREDENTIALS_DIR, 'coldflow_key.key')
 
-# Setup basic logging to capture output
-LOG_FILE = os.path.join(SCRIPT_DIR, 'coldflow.log')
-logging.basicConfig(filename=LOG_FILE, level=logging.INFO,
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+# Route the GUI's own log calls through the same background queue as ColdFlow's
+attach(logging.getLogger(), logging.INFO)
 
 class TkinterHandler(logging.Handler):
-    def __init__(self, text_widget):
-        super().__init__()
+    """
+    Buffers formatted records from the logging thread; the Tk thread drains them in
+    batches with poll(), so worker threads never touch the widget.
+    """
+    def __init__(self, text_widget, max_lines=2000, batch_size=500, interval_ms=100):
+        super().__init__(level=logging.INFO)
         self.text_widget = text_widget
+        self.max_lines = max_lines  # Scrollback cap
+        self.batch_size = batch_size
+        self.interval_ms = interval_ms
+        self.pending = queue.SimpleQueue()
 
     def emit(self, record):
-        msg = self.format(record)
-        self.text_widget.config(state=tk.NORMAL)
-        self.text_widget.insert(tk.END, msg + '\n')
-        self.text_widget.see(tk.END)  # Autoscroll to the bottom
-        self.text_widget.config(state=tk.DISABLED)
+        self.pending.put(self.format(record))
+
+    def poll(self):
+        lines = []
+        while len(lines) < self.batch_size:
+            try:
+                lines.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        if lines:
+            self.text_widget.config(state=tk.NORMAL)
+            self.text_widget.insert(tk.END, '\n'.join(lines) + '\n')
+            line_count = int(self.text_widget.index('end-1c').split('.')[0])
+            if line_count > self.max_lines:
+                self.text_widget.delete('1.0', f'{line_count - self.max_lines}.0')
+            self.text_widget.see(tk.END)  # Autoscroll to the bottom
+            self.text_widget.config(state=tk.DISABLED)
+        self.text_widget.after(self.interval_ms, self.poll)
 
 def generate_key():
     key = Fernet.generate_key()
@@ -89,15 +111,18 @@ def set_environment_variables(email, password, groq_key):
     os.environ["COLDFLOW_EMAIL_ADDRESS"] = email
     os.environ["COLDFLOW_EMAIL_PASSWORD"] = password
     os.environ["GROQ_API_KEY"] = groq_key
+    os.environ["COLDFLOW_GROQ_API_KEY"] = groq_key  # the name CoverLetterGenerator reads
 
 coldflow_running = False
-stop_requested = False
+# The current run's cancellation token, set by the Stop button. Each run gets a new one: a
+# worker of a stopped run may still be in a Groq or SMTP call and must keep seeing it set.
+stop_event = threading.Event()
 
 def run_stop_coldflow(log_text_widget, status_label):
-    global coldflow_running, stop_requested
+    global coldflow_running, stop_event
     if not coldflow_running:
         coldflow_running = True
-        stop_requested = False
+        stop_event = threading.Event()
         run_stop_button.config(text="Stop ColdFlow", style="Stop.TButton")
         status_label.config(text="ColdFlow is running...", foreground="green")  # Changed fg to foreground
 
@@ -111,34 +136,32 @@ def run_stop_coldflow(log_text_widget, status_label):
 
         set_environment_variables(email, password, groq_key)
         excel_file_path = os.path.join(os.path.dirname(SCRIPT_DIR), 'data', 'cold_email_data.xlsx')
-        coldflow_app = ColdFlow(excel_file_path)
-
-        # Redirect logging to the text widget
-        log_handler = TkinterHandler(log_text_widget)
-        logger = logging.getLogger()
-        logger.addHandler(log_handler)
+        coldflow_app = ColdFlow(excel_file_path, stop_event=stop_event)
 
         try:
             coldflow_app.process_excel_sheet()
-            coldflow_app.save_workbook()
-            logging.info("ColdFlow finished successfully.")
-            status_label.config(text="ColdFlow finished.", foreground="blue") # Changed fg to foreground
-            messagebox.showinfo("ColdFlow", "Email processing and Excel update complete.")
+            coldflow_app.save_workbook()  # Also flushes the sends completed before a stop
+            coldflow_app.write_run_report()
+            if coldflow_app.stopped:
+                logging.info(f"ColdFlow stopped after sending {len(coldflow_app.sent_rows)} emails.")
+                status_label.config(text="ColdFlow stopped.", foreground="blue")
+                messagebox.showinfo("ColdFlow", f"Stopped. {len(coldflow_app.sent_rows)} emails were sent and saved.")
+            else:
+                logging.info("ColdFlow finished successfully.")
+                status_label.config(text="ColdFlow finished.", foreground="blue") # Changed fg to foreground
+                messagebox.showinfo("ColdFlow", "Email processing and Excel update complete.")
 
         except Exception as e:
             logging.error(f"An error occurred during ColdFlow execution: {e}", exc_info=True)
             status_label.config(text="ColdFlow encountered an error.", foreground="red") # Changed fg to foreground
             messagebox.showerror("ColdFlow Error", f"An error occurred: {e}")
         finally:
-            logger.removeHandler(log_handler) # Clean up the handler
-            run_stop_button.config(text="Run ColdFlow", style="Run.TButton")
+            run_stop_button.config(state=tk.NORMAL, text="Run ColdFlow", style="Run.TButton")
             coldflow_running = False
-            stop_requested = False # Reset stop request
     else:
-        stop_requested = True
-        run_stop_button.config(state=tk.DISABLED) # Disable button briefly during stop
+        stop_event.set()
+        run_stop_button.config(state=tk.DISABLED) # Re-enabled by the run thread once the stop has been saved
         status_label.config(text="Stopping ColdFlow...", foreground="orange") # Changed fg to foreground
-        root.after(500, lambda: run_stop_button.config(state=tk.NORMAL, text="Run ColdFlow", style="Run.TButton")) # Re-enable after a short delay
 
 def open_settings_window():
     settings_window = tk.Toplevel(root)
@@ -203,6 +226,11 @@ def main():
     log_text_widget.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=5)
     log_text_widget.config(state=tk.DISABLED) # Make it read-only
 
+    # Mirror log records into the text widget, drained on the Tk thread
+    log_handler = TkinterHandler(log_text_widget)
+    add_handler(log_handler)
+    log_handler.poll()
+
     status_label = ttk.Label(main_frame, text="", font=("Arial", 10))
     status_label.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=10)
 
@@ -0,0 +1,125 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Metrics:
+    """
+    Thread-safe registry of stage timings (with error counts) and counters such as LLM tokens
+    and SMTP bytes sent. Stage names are dotted, e.g. "llm.generate" or "excel.save".
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._timings = defaultdict(list)
+            self._errors = defaultdict(int)
+            self._counters = defaultdict(float)
+            self.started_at = time.time()
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the block under `stage`; an exception escaping it counts as an error."""
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            with self._lock:
+                self._errors[stage] += 1
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self._timings[stage].append(seconds)
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def summary(self):
+        with self._lock:
+            timings = {stage: sorted(values) for stage, values in self._timings.items()}
+            errors = dict(self._errors)
+            counters = dict(self._counters)
+        stages = {}
+        for stage in sorted(set(timings) | set(errors)):
+            values = timings.get(stage, [])
+            stages[stage] = {
+                "count": len(values),
+                "errors": errors.get(stage, 0),
+                "total_seconds": round(sum(values), 6),
+                "p50_seconds": percentile(values, 0.50),
+                "p95_seconds": percentile(values, 0.95),
+                "p99_seconds": percentile(values, 0.99),
+                "max_seconds": values[-1] if values else None,
+            }
+        return {
+            "started_at": self.started_at,
+            "wall_seconds": round(time.time() - self.started_at, 6),
+            "stages": stages,
+            "counters": {name: (int(value) if value.is_integer() else value) for name, value in sorted(counters.items())},
+        }
+
+    def write_json(self, path, extra=None):
+        """Write the summary (plus any `extra` sections) as a JSON run report."""
+        report = self.summary()
+        report.update(extra or {})
+        _ensure_parent(path)
+        with open(path, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=2, default=str)
+        return path
+
+    def write_prometheus(self, path):
+        """Write the summary in the Prometheus text exposition format (e.g. for node_exporter's textfile collector)."""
+        summary = self.summary()
+        lines = [
+            "# HELP coldflow_stage_seconds Time spent per ColdFlow stage call.",
+            "# TYPE coldflow_stage_seconds summary",
+        ]
+        for stage, stats in summary["stages"].items():
+            label = f'stage="{stage}"'
+            for quantile, key in (("0.5", "p50_seconds"), ("0.95", "p95_seconds"), ("0.99", "p99_seconds")):
+                if stats[key] is not None:
+                    lines.append(f'coldflow_stage_seconds{{{label},quantile="{quantile}"}} {stats[key]}')
+            lines.append(f'coldflow_stage_seconds_sum{{{label}}} {stats["total_seconds"]}')
+            lines.append(f'coldflow_stage_seconds_count{{{label}}} {stats["count"]}')
+        lines += [
+            "# HELP coldflow_stage_errors_total Stage calls that raised.",
+            "# TYPE coldflow_stage_errors_total counter",
+        ]
+        for stage, stats in summary["stages"].items():
+            lines.append(f'coldflow_stage_errors_total{{stage="{stage}"}} {stats["errors"]}')
+        for name, value in summary["counters"].items():
+            metric = "coldflow_" + re.sub(r'[^a-zA-Z0-9_]', '_', name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        _ensure_parent(path)
+        with open(path, 'w', encoding='utf-8') as metrics_file:
+            metrics_file.write("\n".join(lines) + "\n")
+        return path
+
+
+def _ensure_parent(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+# Process-wide registry shared by the generator, the sender and ColdFlow
+metrics = Metrics()
@@ -0,0 +1,232 @@
+import os
+import sys
+import queue
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../logger')))
+from logger import Logger
+
+log = Logger()
+
+_DONE = object()  # end-of-stream marker passed between stages
+
+
+class Stage:
+    """
+    One step of a pipeline. `func(item)` returns the item to hand to the next stage,
+    or None to drop it. `workers` threads run the stage; its input queue holds at most
+    `queue_size` items, which is what gives the pipeline its backpressure.
+    """
+    def __init__(self, name, func, workers=1, queue_size=16):
+        if workers < 1:
+            raise ValueError(f"Stage '{name}' needs at least one worker.")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class StageStats:
+    """Counters for one stage; read them through Pipeline.snapshot()."""
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.max_queue_depth = 0
+        self.first_started = None
+        self.last_finished = None
+        self.lock = threading.Lock()
+
+    def record(self, started, finished, dropped=False, error=False):
+        with self.lock:
+            if self.first_started is None:
+                self.first_started = started
+            self.last_finished = finished
+            self.busy_seconds += finished - started
+            if error:
+                self.errors += 1
+            elif dropped:
+                self.dropped += 1
+            else:
+                self.processed += 1
+
+    def as_dict(self, queue_depth=0):
+        with self.lock:
+            elapsed = (self.last_finished - self.first_started) if self.first_started is not None else 0.0
+            handled = self.processed + self.dropped + self.errors
+            return {
+                "stage": self.name,
+                "workers": self.workers,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "queue_depth": queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "throughput_per_second": round(handled / elapsed, 2) if elapsed > 0 else None,
+            }
+
+
+class Pipeline:
+    """
+    Runs items from a source iterable through a chain of stages connected by bounded queues,
+    so slow stages (LLM calls) overlap with the others (SMTP sends, sheet updates).
+
+    When every stage has a single worker the pipeline runs inline on the calling thread,
+    one item at a time through all stages, with no queues or extra threads.
+
+    Setting `stop_event` stops pulling from the source; items already inside the pipeline
+    still pass through the stages (which may drop them). Once stopped, run() waits at most
+    `drain_timeout` seconds for the workers and then returns, leaving any still blocked in
+    a call behind as daemon threads.
+    """
+    def __init__(self, stages, source_name="read", report_interval=None, stop_event=None, drain_timeout=10.0):
+        self.stages = list(stages)
+        self.source_name = source_name
+        self.report_interval = report_interval
+        self.stop_event = stop_event
+        self.drain_timeout = drain_timeout
+        self.stats = [StageStats(source_name, 1)] + [StageStats(s.name, s.workers) for s in self.stages]
+        self.queues = []
+
+    @property
+    def stopped(self):
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    @property
+    def sequential(self):
+        return all(stage.workers == 1 for stage in self.stages)
+
+    def snapshot(self):
+        """Per-stage counters, current queue depth and throughput; safe to call while running."""
+        depths = [0] + [q.qsize() for q in self.queues] if self.queues else [0] * len(self.stats)
+        return [stats.as_dict(depth) for stats, depth in zip(self.stats, depths)]
+
+    def log_report(self):
+        for entry in self.snapshot():
+            log.info(
+                f"Stage {entry['stage']}: processed={entry['processed']} dropped={entry['dropped']} "
+                f"errors={entry['errors']} queue={entry['queue_depth']} (max {entry['max_queue_depth']}) "
+                f"throughput={entry['throughput_per_second']}/s"
+            )
+
+    def _call(self, stats, func, item):
+        started = time.monotonic()
+        try:
+            result = func(item)
+        except Exception as e:
+            stats.record(started, time.monotonic(), error=True)
+            log.error(f"Pipeline stage '{stats.name}' failed: {e}")
+            return None
+        stats.record(started, time.monotonic(), dropped=result is None)
+        return result
+
+    def _iter_source(self, source):
+        """Pull items from the source, timing each pull as the source stage's work."""
+        stats = self.stats[0]
+        iterator = iter(source)
+        while True:
+            if self.stopped:
+                log.info(f"Pipeline stopped; no more items are read from '{stats.name}'.")
+                return
+            started = time.monotonic()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except Exception as e:
+                stats.record(started, time.monotonic(), error=True)
+                log.error(f"Pipeline stage '{stats.name}' failed: {e}")
+                return
+            stats.record(started, time.monotonic())
+            yield item
+
+    def run(self, source):
+        """Process every item from `source` and return the final per-stage snapshot."""
+        if self.sequential:
+            self._run_inline(source)
+        else:
+            self._run_threaded(source)
+        self.log_report()
+        return self.snapshot()
+
+    def _run_inline(self, source):
+        for item in self._iter_source(source):
+            for stage, stats in zip(self.stages, self.stats[1:]):
+                item = self._call(stats, stage.func, item)
+                if item is None:
+                    break
+
+    def _run_threaded(self, source):
+        self.queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        threads = []
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            remaining_lock = threading.Lock()
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker, args=(index, remaining, remaining_lock),
+                    name=f"pipeline-{stage.name}-{n}", daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        producer = threading.Thread(target=self._produce, args=(source,), name="pipeline-read", daemon=True)
+        producer.start()
+        threads.append(producer)
+
+        last_report = time.monotonic()
+        drain_deadline = None
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.1 if self.stop_event is not None else 0.5)
+                if self.report_interval and time.monotonic() - last_report >= self.report_interval:
+                    self.log_report()
+                    last_report = time.monotonic()
+                if drain_deadline is None and self.stopped:
+                    drain_deadline = time.monotonic() + self.drain_timeout
+                if drain_deadline is not None and time.monotonic() >= drain_deadline:
+                    busy = [t.name for t in threads if t.is_alive()]
+                    log.warning(f"Pipeline stop: abandoning {len(busy)} workers still busy after "
+                                f"{self.drain_timeout}s: {', '.join(busy)}")
+                    return
+
+    def _put(self, index, item):
+        q = self.queues[index]
+        q.put(item)
+        stats = self.stats[index + 1]
+        depth = q.qsize()
+        with stats.lock:
+            stats.max_queue_depth = max(stats.max_queue_depth, depth)
+
+    def _produce(self, source):
+        try:
+            for item in self._iter_source(source):
+                self._put(0, item)
+        finally:
+            for _ in range(self.stages[0].workers):
+                self.queues[0].put(_DONE)
+
+    def _worker(self, index, remaining, remaining_lock):
+        stage = self.stages[index]
+        stats = self.stats[index + 1]
+        is_last = index == len(self.stages) - 1
+        q = self.queues[index]
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            result = self._call(stats, stage.func, item)
+            if result is not None and not is_last:
+                self._put(index + 1, result)
+
+        with remaining_lock:
+            remaining[0] -= 1
+            last_worker = remaining[0] == 0
+        if last_worker and not is_last:
+            for _ in range(self.stages[index + 1].workers):
+                self.queues[index + 1].put(_DONE)
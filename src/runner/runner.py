@@ -0,0 +1,191 @@
+"""
+Run ColdFlow over several lead workbooks at once, one campaign per workbook:
+
+    python src/runner/runner.py data/campaigns/ --processes 4 --sends-per-minute 60
+
+Each workbook is a shard handled by a single worker process, which owns the file (so no
+two processes ever write the same xlsx) and works through its sheets one after another.
+The LLM request/token budget and the send budget live in a multiprocessing manager and
+are shared by every worker, so more processes spread the xlsx parsing and saving across
+cores without spending the quota any faster.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing.managers import BaseManager
+
+import openpyxl
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../logger')))
+from logger import Logger, restart_in_child
+
+log = Logger()
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../excel')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../llm')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../metrics')))
+import write_excel  # type: ignore
+from rate_limiter import RateLimiter, SharedRateLimiter  # type: ignore
+from metrics import metrics  # type: ignore
+
+
+class BudgetManager(BaseManager):
+    """Serves the rate limiters shared by the worker processes."""
+
+
+BudgetManager.register("RateLimiter", RateLimiter, exposed=("reserve", "settle"))
+
+
+def expand_paths(paths):
+    """Workbook paths for a mix of files, glob patterns and directories (every .xlsx inside)."""
+    workbooks = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = sorted(glob.glob(os.path.join(path, '*.xlsx')))
+        else:
+            matches = sorted(glob.glob(path)) or [path]
+        for match in matches:
+            if os.path.basename(match).startswith('~$'):  # Excel's lock file for an open workbook
+                continue
+            if os.path.abspath(match) not in (os.path.abspath(w) for w in workbooks):
+                workbooks.append(match)
+    return workbooks
+
+
+def coldflow_sheets(path):
+    """Names of the sheets in `path` laid out for ColdFlow (an Email_id column in the header row)."""
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return [worksheet.title for worksheet in workbook.worksheets
+                if "Email_id" in next(worksheet.iter_rows(min_row=2, max_row=2, values_only=True), ())]
+    finally:
+        workbook.close()
+
+
+def run_shard(path, sheets, llm_budget, send_budget, options):
+    """
+    Worker: process `sheets` (default: every ColdFlow sheet) of the workbook at `path`,
+    drawing on the shared budgets, and return a summary per sheet.
+    """
+    write_excel.share_rate_limiter(SharedRateLimiter(llm_budget))
+    send_limiter = SharedRateLimiter(send_budget) if send_budget is not None else None
+    results = []
+    for sheet in sheets or coldflow_sheets(path):
+        started = time.perf_counter()
+        coldflow = write_excel.ColdFlow(path, streaming=options["streaming"], sheet_name=sheet,
+                                        send_limiter=send_limiter)
+        result = {"workbook": path, "sheet": sheet}
+        if coldflow.sheet is None:
+            result["error"] = "Sheet could not be loaded."
+            results.append(result)
+            continue
+        coldflow.process_excel_sheet(workers=options["workers"])
+        saved = coldflow.save_workbook()
+        summary = metrics.summary()
+        result.update({
+            "rows_sent": len(coldflow.sent_rows),
+            "rows_deferred": len(coldflow.deferred_rows),
+            "saved": saved,
+            "seconds": round(time.perf_counter() - started, 3),
+            "counters": summary["counters"],
+        })
+        if not saved:
+            result["error"] = "Workbook could not be saved; its sends are kept in the journal."
+        results.append(result)
+    return results
+
+
+def aggregate(results, wall_seconds):
+    """Totals over the per-sheet summaries."""
+    counters = {}
+    for result in results:
+        for name, value in result.get("counters", {}).items():
+            counters[name] = counters.get(name, 0) + value
+    rows_sent = sum(result.get("rows_sent", 0) for result in results)
+    return {
+        "workbooks": len({result["workbook"] for result in results}),
+        "sheets": len(results),
+        "errors": sum(1 for result in results if "error" in result),
+        "rows_sent": rows_sent,
+        "rows_deferred": sum(result.get("rows_deferred", 0) for result in results),
+        "wall_seconds": round(wall_seconds, 3),
+        "sends_per_second": round(rows_sent / wall_seconds, 2) if wall_seconds > 0 else None,
+        "counters": counters,
+        "shards": results,
+    }
+
+
+def run_shards(paths, sheets=None, processes=None, requests_per_minute=30, tokens_per_minute=6000,
+               sends_per_minute=None, workers=4, streaming=False, report_path=None):
+    """
+    Process every workbook in `paths` (see expand_paths) in a pool of `processes` worker
+    processes, all sharing one LLM budget (`requests_per_minute`, `tokens_per_minute`) and,
+    if `sends_per_minute` is set, one send budget. `sheets` restricts each workbook to those
+    sheet names. Writes the aggregated summary to `report_path` (default
+    reports/shards-<timestamp>.json) and returns it.
+    """
+    workbooks = expand_paths(paths)
+    if not workbooks:
+        log.error(f"No workbooks found in: {', '.join(paths)}")
+        return None
+    processes = processes or min(len(workbooks), os.cpu_count() or 1)
+    options = {"workers": workers, "streaming": streaming}
+    log.info(f"Processing {len(workbooks)} workbooks in {processes} processes.")
+
+    started = time.perf_counter()
+    results = []
+    with BudgetManager() as manager:
+        llm_budget = manager.RateLimiter(requests_per_minute, tokens_per_minute)
+        send_budget = manager.RateLimiter(sends_per_minute) if sends_per_minute else None
+        with ProcessPoolExecutor(max_workers=processes, initializer=restart_in_child) as pool:
+            futures = {pool.submit(run_shard, path, sheets, llm_budget, send_budget, options): path
+                       for path in workbooks}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    shard_results = future.result()
+                except Exception as e:
+                    log.error(f"Shard {path} failed: {e}")
+                    shard_results = [{"workbook": path, "sheet": None, "error": str(e)}]
+                for result in shard_results:
+                    if "error" in result:
+                        log.error(f"{result['workbook']} [{result['sheet']}]: {result['error']}")
+                    else:
+                        log.info(f"{result['workbook']} [{result['sheet']}]: sent {result['rows_sent']}, "
+                                 f"deferred {result['rows_deferred']} in {result['seconds']}s")
+                results.extend(shard_results)
+
+    summary = aggregate(results, time.perf_counter() - started)
+    log.info(f"All shards done: {summary['rows_sent']} sent, {summary['rows_deferred']} deferred, "
+             f"{summary['errors']} errors across {summary['sheets']} sheets in {summary['wall_seconds']}s.")
+    report_path = report_path or os.path.join('reports', f"shards-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    directory = os.path.dirname(report_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as report_file:
+        json.dump(summary, report_file, indent=2, default=str)
+    log.info(f"Shard summary written to: {report_path}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run ColdFlow over several workbooks in parallel processes.")
+    parser.add_argument("paths", nargs="+", help="workbooks, glob patterns or directories of .xlsx files")
+    parser.add_argument("--sheet", action="append", dest="sheets",
+                        help="only process this sheet of each workbook (repeatable; default: every ColdFlow sheet)")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: one per workbook, up to the CPU count)")
+    parser.add_argument("--workers", type=int, default=4, help="pipeline workers per process")
+    parser.add_argument("--requests-per-minute", type=int, default=30, help="shared LLM request budget")
+    parser.add_argument("--tokens-per-minute", type=int, default=6000, help="shared LLM token budget")
+    parser.add_argument("--sends-per-minute", type=int, default=None, help="shared send budget (default: unlimited)")
+    parser.add_argument("--streaming", action="store_true", help="open workbooks read-only and stream their rows")
+    parser.add_argument("--report", default=None, help="where to write the JSON summary")
+    args = parser.parse_args()
+    run_shards(args.paths, sheets=args.sheets, processes=args.processes, workers=args.workers,
+               requests_per_minute=args.requests_per_minute, tokens_per_minute=args.tokens_per_minute,
+               sends_per_minute=args.sends_per_minute, streaming=args.streaming, report_path=args.report)
@@ -0,0 +1,152 @@
+import heapq
+import os
+import sys
+import threading
+from datetime import datetime, time, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../logger')))
+from logger import Logger
+
+log = Logger()
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../excel')))
+from write_excel import ColdFlow  # type: ignore
+
+
+def due_timestamp(next_due):
+    """Turn a next-due date from ColdFlow.row_schedule into the moment the row becomes due."""
+    return datetime.combine(next_due, time.min)
+
+
+class DueIndex:
+    """
+    Min-heap of (due_at, excel_row). Rescheduling a row pushes a new entry and leaves the
+    old one in place; stale entries are discarded lazily when they reach the top.
+    """
+    def __init__(self):
+        self._heap = []
+        self._due_at = {}  # excel_row -> current due_at
+
+    @classmethod
+    def build(cls, coldflow):
+        """Build the index with one pass over the sheet; deferred rows wait for their retry time."""
+        index = cls()
+        for row, next_due in coldflow.row_schedule():
+            if next_due is not None:
+                due_at = due_timestamp(next_due)
+                retry_at = coldflow.deferred_rows.get(row)
+                index.schedule(row, max(due_at, retry_at) if retry_at is not None else due_at)
+        return index
+
+    def schedule(self, row, due_at):
+        """Set (or move) a row's due time; None removes the row from the index."""
+        if due_at is None:
+            self._due_at.pop(row, None)
+            return
+        self._due_at[row] = due_at
+        heapq.heappush(self._heap, (due_at, row))
+
+    def _drop_stale(self):
+        while self._heap and self._due_at.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_due(self):
+        """Earliest due time in the index, or None if nothing is scheduled."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Remove and return every row due at or before `now`, in sheet order."""
+        rows = []
+        self._drop_stale()
+        while self._heap and self._heap[0][0] <= now:
+            _, row = heapq.heappop(self._heap)
+            del self._due_at[row]
+            rows.append(row)
+            self._drop_stale()
+        return sorted(rows)
+
+    def __len__(self):
+        return len(self._due_at)
+
+
+class SchedulerDaemon:
+    """
+    Keeps a ColdFlow workbook loaded and sleeps until its earliest row becomes due, then
+    processes and saves only the due rows and reschedules them from the send results.
+    The sheet is rescanned only when the file is changed by someone else.
+
+    Rows that were due but not sent are woken at the retry time ColdFlow's retry queue gave
+    them, or after `retry_after` if they have none. `poll_interval` bounds each sleep so
+    external edits and stop requests are noticed.
+    """
+    def __init__(self, excel_file_path, workers=4, poll_interval=300,
+                 retry_after=timedelta(hours=1), stop_event=None):
+        self.excel_file_path = excel_file_path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_after = retry_after
+        self.stop_event = stop_event or threading.Event()
+        self.coldflow = None
+        self.index = None
+        self._mtime = None
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.excel_file_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        self.coldflow = ColdFlow(self.excel_file_path, stop_event=self.stop_event)
+        if not self.coldflow.sheet:
+            raise RuntimeError(f"Could not load workbook: {self.excel_file_path}")
+        self.index = DueIndex.build(self.coldflow)
+        self._mtime = self._file_mtime()
+        log.info(f"Scheduler indexed {len(self.index)} rows; next due at {self.index.next_due()}")
+
+    def run_once(self, now=None):
+        """Process every row that is due now; returns the number of rows sent."""
+        now = now or datetime.now()
+        due_rows = self.index.pop_due(now)
+        if not due_rows:
+            return 0
+        log.info(f"Scheduler woke for {len(due_rows)} due rows.")
+        self.coldflow.process_excel_sheet(workers=self.workers, only_rows=set(due_rows))
+        self.coldflow.save_workbook()
+        self._mtime = self._file_mtime()
+
+        sent = self.coldflow.sent_rows
+        for row, next_due in sent.items():
+            self.index.schedule(row, due_timestamp(next_due) if next_due is not None else None)
+        unsent = set(due_rows) - set(sent)
+        if unsent:
+            for row, next_due in self.coldflow.row_schedule(only_rows=unsent):
+                if next_due is None:
+                    continue
+                due_at = due_timestamp(next_due)
+                if due_at <= now:
+                    due_at = self.coldflow.deferred_rows.get(row) or now + self.retry_after
+                self.index.schedule(row, due_at)
+        return len(sent)
+
+    def run(self):
+        """Run until stop_event is set."""
+        self._load()
+        while not self.stop_event.is_set():
+            if self._file_mtime() != self._mtime:
+                log.info("Workbook changed on disk; rebuilding the due index.")
+                self._load()
+            self.run_once()
+
+            next_due = self.index.next_due()
+            timeout = self.poll_interval
+            if next_due is not None:
+                timeout = min(timeout, max(0.0, (next_due - datetime.now()).total_seconds()))
+            log.debug(f"Scheduler sleeping {timeout:.0f}s; next due at {next_due}")
+            self.stop_event.wait(timeout)
+
+
+if __name__ == "__main__":
+    excel_file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'data', 'cold_email_data.xlsx')
+    SchedulerDaemon(excel_file_path).run()
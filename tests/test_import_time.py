@@ -0,0 +1,22 @@
+import os
+import statistics
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/benchmark')))
+from check_import_time import BUDGETS, measure  # type: ignore
+
+
+@pytest.mark.parametrize("module", sorted(BUDGETS))
+def test_import_stays_within_budget(module, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The logger creates logs/ in the working directory
+    if module == "main":
+        pytest.importorskip("tkinter")
+    path, budget = BUDGETS[module]
+    samples = [measure(module, path) for _ in range(3)]
+
+    median = statistics.median(sample["seconds"] for sample in samples)
+    assert median <= budget, f"{module} imports in {median:.3f}s, over its {budget}s budget"
+    assert samples[0]["connections"] == [], "network connections opened at import"
+    assert samples[0]["modules"] == [], "Groq client or pandas imported at import time"